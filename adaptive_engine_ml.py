@@ -1,145 +1,375 @@
-"""
-ML-based Adaptive Engine.
-
-- Uses DecisionTreeClassifier to predict next difficulty (Easy/Medium/Hard)
-  given recent performance features.
-- If no saved model exists, generates simulated training data using
-  heuristics, trains a decision tree, and saves it.
-- Keeps a small rolling buffer of real attempts; retrains the model
-  when enough new real data points are collected (configurable).
-"""
-
-import os
-import joblib
-import numpy as np
-import random
-from collections import deque
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
-
-MODEL_PATH = "model_adaptive_dt.joblib"
-
-LEVELS = ["Easy", "Medium", "Hard"]
-LEVEL_TO_INT = {l: i for i, l in enumerate(LEVELS)}
-INT_TO_LEVEL = {i: l for l, i in LEVEL_TO_INT.items()}
-
-
-def _heuristic_label(cur_level_int, correct_count, avg_time):
-    """Heuristic to generate label for simulated training data."""
-    time_thresh = [8.0, 12.0, 18.0]  # for Easy/Medium/Hard
-    if correct_count >= 2 and avg_time <= time_thresh[cur_level_int]:
-        return min(cur_level_int + 1, 2)
-    if correct_count <= 1 or avg_time > time_thresh[cur_level_int] * 1.5:
-        return max(cur_level_int - 1, 0)
-    return cur_level_int
-
-
-def generate_simulated_data(n_samples=2000, window=3, seed=42):
-    """Simulate dataset for training."""
-    random.seed(seed)
-    np.random.seed(seed)
-    X, y = [], []
-    for _ in range(n_samples):
-        cur_level = random.choice([0, 1, 2])
-        corrects = [random.random() < (0.6 + 0.1 * (cur_level - 1)) for _ in range(window)]
-        correct_count = sum(1 for c in corrects if c)
-        base = [6, 10, 16][cur_level]
-        avg_time = max(1.0, random.gauss(base, base * 0.3))
-        last_correct = 1 if corrects[-1] else 0
-        label = _heuristic_label(cur_level, correct_count, avg_time)
-        X.append([cur_level, correct_count, avg_time, last_correct])
-        y.append(label)
-    return np.array(X), np.array(y)
-
-
-class AdaptiveEngineML:
-    def __init__(self, initial_level="Easy", model_path=MODEL_PATH,
-                 window=3, retrain_after=30, random_state=42):  # ✅ FIXED HERE
-        self.window = window
-        self.retrain_after = retrain_after
-        self.history = deque(maxlen=self.window)
-        self.current_level = initial_level if initial_level in LEVELS else "Easy"
-        self.model_path = model_path
-        self.random_state = random_state
-
-        self.new_examples_X = []
-        self.new_examples_y = []
-
-        if os.path.exists(self.model_path):
-            self.clf = joblib.load(self.model_path)
-            print(f"✅ Loaded model from {self.model_path}")
-        else:
-            print("⚙️ No saved ML model found — training initial model from simulated data...")
-            X, y = generate_simulated_data(n_samples=2500, window=self.window, seed=self.random_state)
-            X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=self.random_state)
-            clf = DecisionTreeClassifier(max_depth=6, random_state=self.random_state)
-            clf.fit(X_train, y_train)
-            y_pred = clf.predict(X_val)
-            print(f"Initial simulated model accuracy (val): {accuracy_score(y_val, y_pred):.3f}")
-            self.clf = clf
-            joblib.dump(self.clf, self.model_path)
-            print(f"💾 Saved initial model to {self.model_path}")
-
-    def _features_from_history(self, cur_level_int):
-        """Build feature vector from history."""
-        hist = list(self.history)
-        if not hist:
-            return np.array([cur_level_int, 1, 10.0, 1]).reshape(1, -1)
-        correct_count = sum(1 for c, t in hist if c)
-        avg_time = sum(t for c, t in hist) / len(hist)
-        last_correct = 1 if hist[-1][0] else 0
-        return np.array([cur_level_int, correct_count, avg_time, last_correct]).reshape(1, -1)
-
-    def predict_next_level(self):
-        cur_idx = LEVEL_TO_INT[self.current_level]
-        X = self._features_from_history(cur_idx)
-        pred_int = int(self.clf.predict(X)[0])
-        return INT_TO_LEVEL.get(pred_int, self.current_level)
-
-    def update(self, correct: bool, response_time: float):
-        """Update after each attempt."""
-        self.history.append((correct, response_time))
-        cur_idx = LEVEL_TO_INT[self.current_level]
-        correct_count = sum(1 for c, t in self.history if c)
-        avg_time = sum(t for c, t in self.history) / len(self.history)
-        last_correct = 1 if self.history[-1][0] else 0
-        feat = [cur_idx, correct_count, avg_time, last_correct]
-        label = _heuristic_label(cur_idx, correct_count, avg_time)
-        self.new_examples_X.append(feat)
-        self.new_examples_y.append(label)
-
-        if len(self.new_examples_y) >= self.retrain_after:
-            print("🔁 Retraining adaptive model with new data...")
-            try:
-                X_sim, y_sim = generate_simulated_data(n_samples=2000, window=self.window, seed=self.random_state + 1)
-                X_comb = np.vstack([X_sim, np.array(self.new_examples_X)])
-                y_comb = np.concatenate([y_sim, np.array(self.new_examples_y)])
-                clf = DecisionTreeClassifier(max_depth=6, random_state=self.random_state)
-                clf.fit(X_comb, y_comb)
-                self.clf = clf
-                joblib.dump(self.clf, self.model_path)
-                print(f"✅ Model retrained and saved at {self.model_path}")
-            except Exception as e:
-                print("❌ Retrain failed:", e)
-            self.new_examples_X = []
-            self.new_examples_y = []
-
-        next_level = self.predict_next_level()
-        cur_idx = LEVEL_TO_INT[self.current_level]
-        next_idx = LEVEL_TO_INT[next_level]
-        if next_idx > cur_idx:
-            self.current_level = LEVELS[min(cur_idx + 1, 2)]
-        elif next_idx < cur_idx:
-            self.current_level = LEVELS[max(cur_idx - 1, 0)]
-        else:
-            self.current_level = LEVELS[cur_idx]
-        return self.current_level
-
-if __name__ == "__main__":
-    engine = AdaptiveEngineML()
-    for i in range(5):
-        correct = random.choice([True, False])
-        time = random.uniform(5, 20)
-        level = engine.update(correct, time)
-        print(f"Attempt {i+1}: correct={correct}, time={time:.1f}s → Next level: {level}")
+"""
+ML-based Adaptive Engine.
+
+- Uses DecisionTreeClassifier to predict next difficulty (Easy/Medium/Hard)
+  given recent performance features.
+- The model is shared by all engines in the process through
+  model_registry.REGISTRY: it is loaded once, or, if no saved model exists,
+  trained once from simulated heuristic data and saved.
+- Keeps a small rolling buffer of real attempts; retrains the model
+  when enough new real data points are collected (configurable). The
+  retrain runs on retrain_worker.RETRAIN_WORKER in the background by
+  default, so update() never waits for it.
+- In tree mode single-learner predictions go through a lookup table
+  compiled from the fitted tree (tree_compiler), verified to match
+  clf.predict.
+- mode="online" swaps the tree for online_model.OnlineCountModel, which
+  learns from every real attempt in O(1) and never retrains.
+- With personal=<personal_models.PersonalModelCache> an engine also feeds
+  its learner's (or cohort's, via personal_key) own model and predicts with
+  it once one has been fitted, falling back to the shared model until then.
+- sklearn is only imported to fit a tree (bootstrap or retrain). A saved
+  model is loaded as a tree_compiler.FlatTree, so starting up and
+  predicting never import it.
+"""
+
+import os
+import numpy as np
+import random
+from collections import deque
+from model_registry import REGISTRY
+from retrain_worker import RETRAIN_WORKER
+from online_model import train_online_model
+from tree_compiler import compiled_for
+from instrumentation import count, timed, timer
+
+MODEL_PATH = "model_adaptive_dt.joblib"
+
+LEVELS = ["Easy", "Medium", "Hard"]
+LEVEL_TO_INT = {l: i for i, l in enumerate(LEVELS)}
+INT_TO_LEVEL = {i: l for l, i in LEVEL_TO_INT.items()}
+TIME_THRESHOLDS = (8.0, 12.0, 18.0)  # avg_time limits of _heuristic_label for Easy/Medium/Hard
+MIN_BATCH = 8       # predict_next_levels hands fewer engines to the per-learner path (grouping costs more)
+SMALL_BATCH = 128  # smaller groups are scored row by row in predict_next_levels (cheaper than building an array)
+
+
+def _heuristic_label(cur_level_int, correct_count, avg_time, time_thresh=TIME_THRESHOLDS):
+    """Heuristic to generate label for simulated training data."""
+    if correct_count >= 2 and avg_time <= time_thresh[cur_level_int]:
+        return min(cur_level_int + 1, 2)
+    if correct_count <= 1 or avg_time > time_thresh[cur_level_int] * 1.5:
+        return max(cur_level_int - 1, 0)
+    return cur_level_int
+
+
+def _heuristic_labels(cur_level, correct_count, avg_time, time_thresh=TIME_THRESHOLDS):
+    """Vectorized _heuristic_label over whole arrays."""
+    cur_level = np.asarray(cur_level, dtype=np.int64)
+    correct_count = np.asarray(correct_count)
+    avg_time = np.asarray(avg_time, dtype=np.float64)
+    thresh = np.asarray(time_thresh, dtype=np.float64)[cur_level]
+    up = (correct_count >= 2) & (avg_time <= thresh)
+    down = (correct_count <= 1) | (avg_time > thresh * 1.5)
+    return np.where(up, np.minimum(cur_level + 1, 2),
+                    np.where(down, np.maximum(cur_level - 1, 0), cur_level))
+
+
+SIM_CACHE_DIR = os.path.join(".cache", "simulated")
+_SIM_VERSION = 2  # bump when the generator changes so stale disk caches are ignored
+_SIM_CACHE = {}   # (n_samples, window, seed) -> (X, y), read-only arrays
+
+
+def _simulate(n_samples, window, seed):
+    rng = np.random.default_rng(seed)
+    cur_level = rng.integers(0, 3, size=n_samples)
+    p_correct = 0.6 + 0.1 * (cur_level - 1)
+    corrects = rng.random((n_samples, window)) < p_correct[:, None]
+    correct_count = corrects.sum(axis=1)
+    base = np.array([6.0, 10.0, 16.0])[cur_level]
+    avg_time = np.maximum(1.0, rng.normal(base, base * 0.3))
+    last_correct = corrects[:, -1].astype(np.int64)
+    X = np.column_stack([cur_level, correct_count, avg_time, last_correct]).astype(np.float64)
+    y = _heuristic_labels(cur_level, correct_count, avg_time)
+    return X, y
+
+
+def generate_simulated_data(n_samples=2000, window=3, seed=42, use_cache=True):
+    """
+    Simulate dataset for training.
+
+    The output only depends on (n_samples, window, seed), so it is memoized
+    in memory and in SIM_CACHE_DIR on disk. Cached arrays are read-only;
+    copy them before modifying.
+    """
+    key = (n_samples, window, seed)
+    if use_cache and key in _SIM_CACHE:
+        return _SIM_CACHE[key]
+
+    path = os.path.join(SIM_CACHE_DIR, f"sim_v{_SIM_VERSION}_{n_samples}_{window}_{seed}.npz")
+    X = y = None
+    if use_cache and os.path.exists(path):
+        try:
+            with np.load(path) as data:
+                X, y = data["X"], data["y"]
+        except Exception:
+            X = y = None  # unreadable cache file, regenerate below
+    if X is None:
+        X, y = _simulate(n_samples, window, seed)
+        if use_cache:
+            try:
+                os.makedirs(SIM_CACHE_DIR, exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp.npz"
+                np.savez(tmp, X=X, y=y)
+                os.replace(tmp, path)
+            except OSError:
+                pass  # disk cache is best-effort
+
+    if use_cache:
+        X.flags.writeable = False
+        y.flags.writeable = False
+        _SIM_CACHE[key] = (X, y)
+    return X, y
+
+
+def train_initial_model(window=3, random_state=42):
+    """Train the bootstrap decision tree on simulated heuristic data."""
+    from sklearn.metrics import accuracy_score
+    from sklearn.model_selection import train_test_split
+    from sklearn.tree import DecisionTreeClassifier
+
+    print("⚙️ No saved ML model found — training initial model from simulated data...")
+    X, y = generate_simulated_data(n_samples=2500, window=window, seed=random_state)
+    X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=random_state)
+    clf = DecisionTreeClassifier(max_depth=6, random_state=random_state)
+    clf.fit(X_train, y_train)
+    y_pred = clf.predict(X_val)
+    print(f"Initial simulated model accuracy (val): {accuracy_score(y_val, y_pred):.3f}")
+    return clf
+
+
+class AdaptiveEngineML:
+    def __init__(self, initial_level="Easy", model_path=MODEL_PATH,
+                 window=3, retrain_after=30, random_state=42, registry=None,
+                 background_retrain=True, retrain_worker=None, mode="tree",
+                 personal=None, personal_key=None):  # ✅ FIXED HERE
+        if mode not in ("tree", "online"):
+            raise ValueError("mode must be 'tree' or 'online'")
+        if personal is not None and (mode != "tree" or personal_key is None):
+            raise ValueError("personal models need mode='tree' and a personal_key")
+        self.mode = mode
+        self.window = window
+        self.retrain_after = retrain_after
+        self.history = deque(maxlen=self.window)
+        # running sums over history, kept in step by _push() so features are O(1) in window
+        self._correct_sum = 0
+        self._time_sum = 0.0
+        self._pushes_since_resync = 0
+        self.current_level = initial_level if initial_level in LEVELS else "Easy"
+        self.model_path = model_path
+        self.random_state = random_state
+        self.registry = registry if registry is not None else REGISTRY
+        if background_retrain:
+            self.retrain_worker = retrain_worker if retrain_worker is not None else RETRAIN_WORKER
+        else:
+            self.retrain_worker = None
+
+        self.new_examples_X = []
+        self.new_examples_y = []
+        self.personal = personal          # PersonalModelCache, or None to use the shared model only
+        self.personal_key = personal_key  # learner (or cohort) whose personal model this engine feeds
+        if personal is not None:
+            personal.get(personal_key, self.window)  # ValueError if key's model is for another window
+
+        if self.mode == "online":
+            # in-memory only; shared by every online engine with the same window/seed
+            self._model_key = f"online:{self.window}:{self.random_state}"
+            self._persist = False
+        else:
+            self._model_key = self.model_path
+            self._persist = True
+        self._group_key = (id(self.registry), self._model_key, self.window, self.mode)  # for predict_next_levels
+
+        # load (or train, and compile) the shared model up front so the first answer doesn't pay for it
+        clf = self.registry.get(self._model_key, self._train_initial, self._persist)
+        if self.mode == "tree":
+            compiled_for(clf, self.window)
+
+    def _train_initial(self):
+        if self.mode == "online":
+            return train_online_model(window=self.window, random_state=self.random_state)
+        return train_initial_model(window=self.window, random_state=self.random_state)
+
+    @property
+    def clf(self):
+        """
+        The model this engine predicts with (read-only in tree mode): the
+        learner's personal tree once fitted, else the shared published model.
+        """
+        if self.personal is not None:
+            tree = self.personal.tree_for(self.personal_key, self.window)
+            if tree is not None:
+                return tree
+        return self.registry.get(self._model_key, self._train_initial, self._persist)
+
+    def _push(self, correct, response_time):
+        """Append an attempt to history, updating the running sums for the evicted/new entries."""
+        hist = self.history
+        if len(hist) == hist.maxlen:
+            old_correct, old_time = hist[0]
+            self._correct_sum -= 1 if old_correct else 0
+            self._time_sum -= old_time
+        hist.append((correct, response_time))
+        self._correct_sum += 1 if correct else 0
+        self._time_sum += response_time
+        # subtracting evicted floats slowly accumulates rounding error; re-sum now and then
+        # (O(window) every >= window pushes, so still O(1) amortized)
+        self._pushes_since_resync += 1
+        if self._pushes_since_resync >= max(1024, self.window):
+            self._resync()
+
+    def _resync(self):
+        """Recompute the running sums from history."""
+        self._correct_sum = sum(1 for c, t in self.history if c)
+        self._time_sum = sum(t for c, t in self.history)
+        self._pushes_since_resync = 0
+
+    def _feature_row(self, cur_level_int):
+        """Feature row [cur_level, correct_count, avg_time, last_correct] as a plain list."""
+        n = len(self.history)
+        if not n:
+            return [cur_level_int, 1, 10.0, 1]
+        last_correct = 1 if self.history[-1][0] else 0
+        return [cur_level_int, self._correct_sum, self._time_sum / n, last_correct]
+
+    def _features_from_history(self, cur_level_int):
+        """Build feature vector from history."""
+        return np.array(self._feature_row(cur_level_int)).reshape(1, -1)
+
+    @timed("engine.predict")
+    def predict_next_level(self, feat=None):
+        """Predict the next level; feat is an already-built _feature_row for the current level."""
+        if feat is None:
+            feat = self._feature_row(LEVEL_TO_INT[self.current_level])
+        clf = self.clf
+        if self.mode == "tree":
+            compiled = compiled_for(clf, self.window)
+            if compiled is not None:
+                return INT_TO_LEVEL.get(compiled.predict_one(feat), self.current_level)
+        pred_int = int(clf.predict(np.array(feat).reshape(1, -1))[0])
+        return INT_TO_LEVEL.get(pred_int, self.current_level)
+
+    def _observe(self, correct, response_time):
+        """
+        Record an attempt: online update, or retrain buffer (retrains when due).
+        Returns the feature row, which is also the row for the next prediction.
+        """
+        with timer("engine.features"):
+            self._push(correct, response_time)
+            feat = self._feature_row(LEVEL_TO_INT[self.current_level])
+        label = _heuristic_label(feat[0], feat[1], feat[2])
+        if self.personal is not None:
+            self.personal.observe(self.personal_key, feat, correct, response_time, self.retrain_worker, self.window)
+        if self.mode == "online":
+            self.clf.partial_fit_one(feat, label)
+            return feat
+        self.new_examples_X.append(list(feat))
+        self.new_examples_y.append(label)
+
+        if len(self.new_examples_y) >= self.retrain_after:
+            X_new, y_new = self.new_examples_X, self.new_examples_y
+            self.new_examples_X = []
+            self.new_examples_y = []
+            count("engine.retrain_triggered")
+            if self.retrain_worker is not None:
+                print("🔁 Queued background retrain with new data...")
+                self.retrain_worker.submit((id(self.registry), self.model_path), X_new, y_new, self._retrain)
+            else:
+                print("🔁 Retraining adaptive model with new data...")
+                try:
+                    self._retrain(X_new, y_new)
+                except Exception as e:
+                    print("❌ Retrain failed:", e)
+        return feat
+
+    @timed("engine.retrain")
+    def _retrain(self, X_new, y_new):
+        """Fit a fresh tree on simulated + new real examples and publish it."""
+        from sklearn.tree import DecisionTreeClassifier
+
+        X_sim, y_sim = generate_simulated_data(n_samples=2000, window=self.window, seed=self.random_state + 1)
+        X_comb = np.vstack([X_sim, np.array(X_new)])
+        y_comb = np.concatenate([y_sim, np.array(y_new)])
+        clf = DecisionTreeClassifier(max_depth=6, random_state=self.random_state)
+        clf.fit(X_comb, y_comb)
+        compiled_for(clf, self.window)  # compile here, not on the first learner's predict
+        self.registry.publish(self.model_path, clf)
+        print(f"✅ Model retrained and saved at {self.model_path}")
+
+    def _advance(self, next_level):
+        """Move current_level one step towards the predicted level."""
+        cur_idx = LEVEL_TO_INT[self.current_level]
+        next_idx = LEVEL_TO_INT[next_level]
+        if next_idx > cur_idx:
+            self.current_level = LEVELS[min(cur_idx + 1, 2)]
+        elif next_idx < cur_idx:
+            self.current_level = LEVELS[max(cur_idx - 1, 0)]
+        else:
+            self.current_level = LEVELS[cur_idx]
+        return self.current_level
+
+    @timed("engine.update")
+    def update(self, correct: bool, response_time: float):
+        """Update after each attempt."""
+        feat = self._observe(correct, response_time)
+        return self._advance(self.predict_next_level(feat))
+
+
+@timed("engine.predict_batch")
+def predict_next_levels(engines):
+    """
+    Batched predict_next_level for many learners.
+
+    Feature rows from all engines are grouped by model (looked up once per
+    group) and scored together: with one vectorized CompiledTree.predict
+    when the model has a compiled table, otherwise with a single
+    clf.predict call per model instead of one per learner.
+    Returns the same list as [e.predict_next_level() for e in engines].
+
+    Batching pays off from about MIN_BATCH engines on (tree mode: ~1.2x at
+    8-16, ~1.7x from a few hundred; online mode: ~6x at 8); smaller lists
+    simply take the per-learner path.
+    """
+    engines = list(engines)
+    if len(engines) < MIN_BATCH:
+        return [eng.predict_next_level() for eng in engines]
+    groups = {}  # model key -> (clf, window, mode, engine positions, feature rows flattened)
+    for i, eng in enumerate(engines):
+        tree = eng.personal.tree_for(eng.personal_key, eng.window) if eng.personal is not None else None
+        # engines on the shared model resolve it once per group, not once per engine
+        key = (id(tree), eng.window, eng.mode) if tree is not None else eng._group_key
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = (tree if tree is not None else eng.clf, eng.window, eng.mode, [], [])
+        group[3].append(i)
+        group[4].extend(eng._feature_row(LEVEL_TO_INT[eng.current_level]))
+
+    levels = [None] * len(engines)
+    for clf, window, mode, idx, flat in groups.values():
+        compiled = compiled_for(clf, window) if mode == "tree" else None
+        if compiled is not None and len(idx) < SMALL_BATCH:
+            preds = [compiled.predict_one(flat[j:j + 4]) for j in range(0, len(flat), 4)]
+        else:
+            X = np.fromiter(flat, dtype=np.float64, count=len(flat)).reshape(-1, 4)
+            preds = (compiled if compiled is not None else clf).predict(X).tolist()
+        for i, p in zip(idx, preds):
+            levels[i] = INT_TO_LEVEL.get(int(p), engines[i].current_level)
+    return levels
+
+
+def update_many(engines, attempts):
+    """
+    Batched update: attempts holds one (correct, response_time) pair per
+    engine. Same result as calling engine.update(...) on each engine.
+    """
+    engines = list(engines)
+    for eng, (correct, response_time) in zip(engines, attempts):
+        eng._observe(correct, response_time)
+    return [eng._advance(lvl) for eng, lvl in zip(engines, predict_next_levels(engines))]
+
+if __name__ == "__main__":
+    engine = AdaptiveEngineML()
+    for i in range(5):
+        correct = random.choice([True, False])
+        time = random.uniform(5, 20)
+        level = engine.update(correct, time)
+        print(f"Attempt {i+1}: correct={correct}, time={time:.1f}s → Next level: {level}")
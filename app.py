@@ -1,103 +1,205 @@
-import streamlit as st
-import time
-import pandas as pd
-from puzzle_generator import PuzzleGenerator
-from tracker import PerformanceTracker
-from adaptive_engine_ml import AdaptiveEngineML
-from progress_summary import ProgressSummary
-
-st.set_page_config(page_title="AI-Powered Adaptive Math Learning", page_icon="🧠")
-
-# --- App State ---
-if "started" not in st.session_state:
-    st.session_state.started = False
-    st.session_state.tracker = None
-    st.session_state.engine = None
-    st.session_state.puzzle = None
-    st.session_state.pg = None
-    st.session_state.last_time = None
-    st.session_state.round = 1
-
-# --- Header ---
-st.title("🧠 AI-Powered Adaptive Math Learning Prototype")
-st.markdown("Practice math problems with adaptive difficulty that adjusts to your skill level!")
-
-# --- Start Screen ---
-if not st.session_state.started:
-    name = st.text_input("Enter your name:", "")
-    diff = st.selectbox("Choose initial difficulty:", ["Easy", "Medium", "Hard"])
-    total = st.number_input("Number of puzzles:", min_value=3, max_value=30, value=10)
-    start_btn = st.button("🚀 Start Session")
-
-    if start_btn and name.strip():
-        st.session_state.name = name.strip()
-        st.session_state.rounds = total
-        st.session_state.pg = PuzzleGenerator()
-        st.session_state.tracker = PerformanceTracker(user=name)
-        st.session_state.engine = AdaptiveEngineML(initial_level=diff)
-        st.session_state.started = True
-        st.session_state.round = 1
-        st.session_state.puzzle = st.session_state.pg.generate(diff)
-        st.session_state.last_time = time.time()
-        st.rerun()
-
-else:
-    # --- Active Session ---
-    total_rounds = st.session_state.rounds
-    current_round = st.session_state.round
-    engine = st.session_state.engine
-    tracker = st.session_state.tracker
-    puzzle = st.session_state.puzzle
-    pg = st.session_state.pg
-
-    st.subheader(f"Round {current_round}/{total_rounds}")
-    st.markdown(f"*Difficulty:* {engine.current_level}")
-    st.markdown(f"### ❓ {puzzle.prompt}")
-
-    user_answer = st.text_input("Your answer:", key=f"answer_{current_round}")
-    submit_btn = st.button("Submit")
-
-    if submit_btn:
-        elapsed = time.time() - st.session_state.last_time
-        try:
-            ans = float(user_answer)
-        except:
-            ans = None
-
-        correct = puzzle.check_answer(ans)
-        tracker.log_attempt(puzzle, correct, elapsed, engine.current_level)
-
-        if correct:
-            st.success(f"✅ Correct! (took {elapsed:.2f}s)")
-        else:
-            st.error(f"❌ Incorrect. Correct answer was {puzzle.answer} (took {elapsed:.2f}s)")
-
-        next_level = engine.update(correct=correct, response_time=elapsed)
-        st.session_state.round += 1
-
-        if st.session_state.round <= total_rounds:
-            st.session_state.puzzle = pg.generate(next_level)
-            st.session_state.last_time = time.time()
-            st.rerun()
-        else:
-            st.session_state.started = False
-
-            st.success("🎉 Session Complete!")
-            summary = ProgressSummary(tracker)
-            df = tracker.to_dataframe()
-
-            st.subheader("📊 Performance Summary")
-            total = len(df)
-            acc = df["correct"].mean() * 100
-            avg_time = df["time_taken"].mean()
-            st.write(f"*Accuracy:* {acc:.1f}%  |  *Avg Time:* {avg_time:.2f}s")
-
-            st.dataframe(df[["difficulty", "prompt", "correct", "time_taken"]].tail(10))
-            summary.print_summary()
-            csv_path = tracker.save_csv()
-            st.info(f"Session log saved to {csv_path}")
-
-            if st.button("🔁 Restart"):
-                for key in list(st.session_state.keys()):
-                    del st.session_state[key]
-                st.rerun()
\ No newline at end of file
+import streamlit as st
+import threading
+import time
+import uuid
+from puzzle_generator import PooledPuzzleGenerator
+from tracker import PerformanceTracker
+from adaptive_engine_ml import MODEL_PATH, AdaptiveEngineML, train_initial_model
+from model_registry import REGISTRY
+from engine_snapshots import EngineSnapshotStore
+from tree_compiler import compiled_for
+import instrumentation
+
+st.set_page_config(page_title="AI-Powered Adaptive Math Learning", page_icon="🧠")
+
+METRICS_VIEWER_TTL = 600  # s; a session that closed its tab with the metrics box ticked stops counting after this
+
+# --- Shared resources (one per server process, reused by every session and rerun) ---
+
+@st.cache_resource(show_spinner="Loading the adaptive model...")
+def shared_model():
+    # load (or train) and compile the model once; engines read the registry, so retrains still reach them
+    clf = REGISTRY.get(MODEL_PATH, train_initial_model)
+    compiled_for(clf)
+    return clf
+
+
+@st.cache_resource
+def puzzle_generator():
+    # pre-generated, thread-safe puzzle pools shared by all sessions
+    return PooledPuzzleGenerator()
+
+
+@st.cache_resource
+def snapshot_store():
+    # one store per server process: learners resume their level/history after a restart
+    return EngineSnapshotStore()
+
+
+@st.cache_resource
+def metrics_viewers():
+    # sessions with the metrics panel open (id -> last render), and whether ADAPTIVE_METRICS had recording on
+    return {"sessions": {}, "lock": threading.Lock(), "forced": instrumentation.is_enabled()}
+
+
+def track_metrics(show):
+    """Record metrics while at least one session has the panel open; the last one to close it switches them off."""
+    viewers = metrics_viewers()
+    if "viewer_id" not in st.session_state:
+        st.session_state.viewer_id = uuid.uuid4().hex
+    now = time.time()
+    with viewers["lock"]:
+        sessions = viewers["sessions"]
+        if show:
+            sessions[st.session_state.viewer_id] = now
+        else:
+            sessions.pop(st.session_state.viewer_id, None)
+        for key, seen in list(sessions.items()):
+            if now - seen > METRICS_VIEWER_TTL:
+                del sessions[key]
+        if sessions:
+            instrumentation.enable()
+        elif not viewers["forced"]:
+            instrumentation.disable()
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def session_report(session_key, attempts, _tracker):
+    """Final-screen numbers for a session from the tracker's running stats: O(1) in session length."""
+    stats = _tracker.stats
+    by_diff = stats.by_difficulty()
+    last = _tracker.attempts.columns(last=10)
+    return {
+        "summary": stats.as_dict(),
+        "by_difficulty": {
+            "difficulty": [d for d, _, _, _ in by_diff],
+            "attempts": [n for _, n, _, _ in by_diff],
+            "accuracy %": [round(a, 2) for _, _, a, _ in by_diff],
+            "avg time (s)": [round(t, 2) for _, _, _, t in by_diff],
+        },
+        "trend": stats.trend(5),
+        "recent": {k: last[k].tolist() for k in ("difficulty", "prompt", "correct", "time_taken")},
+    }
+
+
+# --- App State ---
+if "phase" not in st.session_state:
+    st.session_state.phase = "start"  # start -> quiz -> done
+
+# --- Header ---
+st.title("🧠 AI-Powered Adaptive Math Learning Prototype")
+st.markdown("Practice math problems with adaptive difficulty that adjusts to your skill level!")
+
+# --- Debug metrics (process-wide, shared by every session of this server) ---
+show_metrics = st.sidebar.checkbox("🔧 Performance metrics")
+track_metrics(show_metrics)
+
+
+def start_screen():
+    name = st.text_input("Enter your name:", "")
+    diff = st.selectbox("Choose initial difficulty:", ["Easy", "Medium", "Hard"])
+    total = st.number_input("Number of puzzles:", min_value=3, max_value=30, value=10)
+    start_btn = st.button("🚀 Start Session")
+
+    if start_btn and name.strip():
+        s = st.session_state
+        shared_model()
+        s.name = name.strip()
+        s.session_key = uuid.uuid4().hex
+        s.rounds = total
+        s.tracker = PerformanceTracker(user=name)
+        engine = snapshot_store().restore(s.name)
+        s.resumed = engine is not None
+        s.engine = engine or AdaptiveEngineML(initial_level=diff)
+        s.round = 1
+        s.feedback = None
+        s.puzzle = puzzle_generator().generate(s.engine.current_level)
+        s.last_time = time.time()
+        s.phase = "quiz"
+        st.rerun()
+
+
+def submit_answer():
+    # button callback: runs before the fragment redraws, so the new puzzle shows without an extra rerun
+    s = st.session_state
+    engine, puzzle = s.engine, s.puzzle
+    elapsed = time.time() - s.last_time
+    correct = puzzle.check_answer(s.get(f"answer_{s.round}", ""))  # the raw text; parsed exactly as an integer
+    s.tracker.log_attempt(puzzle, correct, elapsed, engine.current_level)
+    if correct:
+        s.feedback = ("success", f"✅ Correct! (took {elapsed:.2f}s)")
+    else:
+        s.feedback = ("error", f"❌ Incorrect. Correct answer was {puzzle.answer} (took {elapsed:.2f}s)")
+
+    next_level = engine.update(correct=correct, response_time=elapsed)
+    snapshot_store().save(s.name, engine)
+    s.round += 1
+    if s.round <= s.rounds:
+        s.puzzle = puzzle_generator().generate(next_level)
+        s.last_time = time.time()
+    else:
+        s.phase = "done"
+
+
+@st.fragment
+def question_card():
+    # a submit reruns only this fragment; header, sidebar and the rest of the page are left as they are
+    s = st.session_state
+    if s.phase != "quiz":
+        st.rerun()  # session over: redraw the whole page for the final screen
+    engine = s.engine
+
+    if s.round == 1 and s.get("resumed"):
+        st.info(f"Welcome back! Resuming at {engine.current_level} difficulty.")
+    if s.feedback is not None:
+        kind, message = s.feedback
+        (st.success if kind == "success" else st.error)(message)
+    st.subheader(f"Round {s.round}/{s.rounds}")
+    st.markdown(f"*Difficulty:* {engine.current_level}")
+    st.markdown(f"### ❓ {s.puzzle.prompt}")
+
+    st.text_input("Your answer:", key=f"answer_{s.round}")
+    st.button("Submit", on_click=submit_answer)
+
+
+def final_screen():
+    s = st.session_state
+    tracker = s.tracker
+    if s.feedback is not None:
+        kind, message = s.feedback
+        (st.success if kind == "success" else st.error)(message)
+    st.success("🎉 Session Complete!")
+    report = session_report(s.session_key, len(tracker.attempts), _tracker=tracker)
+    summary = report["summary"]
+
+    st.subheader("📊 Performance Summary")
+    st.write(f"*Accuracy:* {summary['accuracy']:.1f}%  |  *Avg Time:* {summary['avg_time']:.2f}s")
+    st.dataframe(report["by_difficulty"])
+    n, trend_acc, trend_time = report["trend"]
+    if n:
+        st.write(f"*Recent trend (last {n}):* Accuracy {trend_acc:.1f}%, Avg time {trend_time:.2f}s")
+    st.write(f"*Recommended next level:* {summary['recommended_next_level']}")
+    st.markdown("*Last 10 attempts*")
+    st.dataframe(report["recent"])
+
+    # writing the log is O(session length), so it happens on request, not on every render
+    if st.button("💾 Save session log"):
+        s.csv_path = tracker.save_csv()
+    if "csv_path" in s:
+        st.info(f"Session log saved to {s.csv_path}")
+
+    if st.button("🔁 Restart"):
+        for key in list(s.keys()):
+            del s[key]
+        st.rerun()
+
+
+if st.session_state.phase == "start":
+    start_screen()
+elif st.session_state.phase == "quiz":
+    question_card()
+else:
+    final_screen()
+
+if show_metrics:
+    instrumentation.streamlit_panel(st.sidebar, expanded=True)
@@ -0,0 +1,184 @@
+"""
+Columnar storage for PerformanceTracker attempts.
+
+Instead of one 7-key dict per attempt, every field lives in its own
+NumPy column that grows by doubling:
+
+- timestamp   int64 epoch nanoseconds (viewed as datetime64[ns], UTC)
+- difficulty  int8 code into a small list of names ("Easy", "Medium", ...)
+- prompt      int32 code into a list of unique (interned) prompt strings;
+              puzzles are looked up by their (a, b, op) key
+- answer      int64 (non-integer answers are kept in a small side dict)
+- correct     bool
+- time_taken  float64
+
+The user name is stored once. columns() / to_dataframe() hand out
+read-only views of the filled part of each column, so numeric columns
+are zero-copy. Growing or trimming allocates new buffers, so views
+handed out earlier stay valid.
+"""
+
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+FIELDS = ["timestamp", "user", "difficulty", "prompt", "answer", "correct", "time_taken"]
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+
+
+def iso_utc(ts_ns):
+    """Epoch nanoseconds -> naive UTC ISO string (the format trackers have always logged)."""
+    return datetime.fromtimestamp(ts_ns // 1000 / 1e6, timezone.utc).replace(tzinfo=None).isoformat(timespec="microseconds")
+
+
+class AttemptStore:
+    def __init__(self, user, capacity=64, retain=None):
+        """retain=N keeps only the last N attempts."""
+        self.user = user
+        self.retain = retain
+        self._start = 0  # rows before _start were dropped by retain (compacted away on the next grow)
+        self._n = 0      # rows used in the buffers
+        self._ts = np.empty(capacity, dtype=np.int64)
+        self._diff = np.empty(capacity, dtype=np.int8)
+        self._prompt = np.empty(capacity, dtype=np.int32)
+        self._answer = np.empty(capacity, dtype=np.int64)
+        self._correct = np.empty(capacity, dtype=np.bool_)
+        self._time = np.empty(capacity, dtype=np.float64)
+        self._diff_names = list(DIFFICULTIES)
+        self._diff_codes = {d: i for i, d in enumerate(self._diff_names)}
+        self._prompts = []
+        self._prompt_codes = {}
+        self._puzzle_codes = {}  # Puzzle.key -> prompt code, so known puzzles never render their prompt
+        self._odd_answers = {}  # row -> answer that isn't an int (e.g. "4" or 2.5)
+
+    def __len__(self):
+        return self._n - self._start
+
+    def _columns(self):
+        return ("_ts", "_diff", "_prompt", "_answer", "_correct", "_time")
+
+    def _resize(self, capacity):
+        """Move the live rows into fresh buffers of the given capacity."""
+        start, live = self._start, self._n - self._start
+        for name in self._columns():
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:live] = old[start:self._n]
+            setattr(self, name, new)
+        if self._odd_answers and start:
+            self._odd_answers = {i - start: a for i, a in self._odd_answers.items() if i >= start}
+        self._start, self._n = 0, live
+
+    def _code(self, value, codes, names):
+        code = codes.get(value)
+        if code is None:
+            value = sys.intern(value) if isinstance(value, str) else value
+            code = codes[value] = len(names)
+            names.append(value)
+        return code
+
+    def _prompt_code(self, prompt):
+        if isinstance(prompt, str):
+            return self._code(prompt, self._prompt_codes, self._prompts)
+        key = getattr(prompt, "key", None)
+        if key is None:
+            return self._code(prompt.prompt, self._prompt_codes, self._prompts)
+        code = self._puzzle_codes.get(key)
+        if code is None:
+            code = self._puzzle_codes[key] = self._code(prompt.prompt, self._prompt_codes, self._prompts)
+        return code
+
+    def append(self, ts_ns, difficulty, prompt, answer, correct, time_taken):
+        """prompt is the prompt string or the puzzle itself (interned by its key when it has one)."""
+        if self._n == len(self._ts):
+            live = self._n - self._start
+            # with retain, compacting usually frees enough room; otherwise double
+            self._resize(len(self._ts) if live * 2 <= len(self._ts) else 2 * max(live, 1))
+        n = self._n
+        self._ts[n] = ts_ns
+        self._diff[n] = self._code(difficulty, self._diff_codes, self._diff_names)
+        self._prompt[n] = self._prompt_code(prompt)
+        if isinstance(answer, (int, np.integer)) and not isinstance(answer, bool):
+            self._answer[n] = answer
+        else:
+            self._answer[n] = 0
+            self._odd_answers[n] = answer
+        self._correct[n] = correct
+        self._time[n] = time_taken
+        self._n = n + 1
+        if self.retain and self._n - self._start > self.retain:
+            self._odd_answers.pop(self._start, None)
+            self._start += 1
+
+    def columns(self, categorical=False, last=None):
+        """
+        Dict of column arrays for the stored attempts (FIELDS order, minus
+        the constant 'user'), or only the last `last` of them. Numeric
+        columns are read-only views. difficulty/prompt are pandas
+        Categoricals when categorical=True, otherwise object arrays of the
+        (shared) strings.
+        """
+        start, n = self._start, self._n
+        if last is not None:
+            start = max(start, n - last)
+        cols = {}
+        for field, name in zip(("timestamp", "difficulty", "prompt", "answer", "correct", "time_taken"),
+                               self._columns()):
+            view = getattr(self, name)[start:n]
+            view.flags.writeable = False
+            cols[field] = view
+        cols["timestamp"] = cols["timestamp"].view("datetime64[ns]")
+        for field, names in (("difficulty", self._diff_names), ("prompt", self._prompts)):
+            if categorical:
+                import pandas as pd
+                cols[field] = pd.Categorical.from_codes(cols[field], categories=names)
+            else:
+                cols[field] = np.array(names, dtype=object).take(cols[field]) if names else np.empty(0, dtype=object)
+        if self._odd_answers:
+            answers = cols["answer"].astype(object)
+            for i, a in self._odd_answers.items():
+                if i >= start:
+                    answers[i - start] = a
+            cols["answer"] = answers
+        return cols
+
+    def to_dataframe(self, categorical=False):
+        import pandas as pd
+        cols = self.columns(categorical)
+        data = {f: (self.user if f == "user" else cols[f]) for f in FIELDS}
+        if not len(self):
+            return pd.DataFrame(columns=FIELDS)
+        return pd.DataFrame(data, copy=False)
+
+    def record(self, i):
+        """Attempt i as the classic dict (ISO timestamp string), negative indexes allowed."""
+        size = len(self)
+        if i < 0:
+            i += size
+        if not 0 <= i < size:
+            raise IndexError("attempt index out of range")
+        i += self._start
+        return {
+            "timestamp": iso_utc(int(self._ts[i])),
+            "user": self.user,
+            "difficulty": self._diff_names[self._diff[i]],
+            "prompt": self._prompts[self._prompt[i]],
+            "answer": self._odd_answers.get(i, int(self._answer[i])),
+            "correct": bool(self._correct[i]),
+            "time_taken": float(self._time[i]),
+        }
+
+    def __getitem__(self, i):
+        return self.record(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def nbytes(self):
+        """Approximate memory held by the store (buffers + unique strings)."""
+        cols = sum(getattr(self, name).nbytes for name in self._columns())
+        strings = sum(sys.getsizeof(p) for p in self._prompts)
+        return (cols + strings + sys.getsizeof(self._prompts) + sys.getsizeof(self._prompt_codes)
+                + sys.getsizeof(self._puzzle_codes))
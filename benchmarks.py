@@ -0,0 +1,644 @@
+"""
+Micro-benchmarks for the adaptive learning hot paths.
+
+Run all of them:      python benchmarks.py
+Run a single one:     python benchmarks.py batch_inference
+"""
+
+import contextlib
+import io
+import random
+import sys
+import time
+
+
+def _timeit(fn, repeat=5):
+    """Best-of-N wall time of fn() in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _quiet(fn, *args, **kwargs):
+    """Call fn with stdout swallowed (engines print on load/retrain)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def _random_engines(n, seed=0, mode="tree"):
+    """n engines with random levels/histories (they share the registry's model)."""
+    from adaptive_engine_ml import AdaptiveEngineML, LEVELS
+    rng = random.Random(seed)
+    engines = []
+    for _ in range(n):
+        eng = _quiet(AdaptiveEngineML, initial_level=rng.choice(LEVELS), mode=mode)
+        for _ in range(rng.randint(0, eng.window)):
+            eng._push(rng.random() < 0.6, rng.uniform(2, 30))
+        engines.append(eng)
+    return engines
+
+
+def bench_batch_inference(batch_sizes=(1, 8, 64, 512, 4096)):
+    """Per-learner predict_next_level loop vs one predict_next_levels call."""
+    from adaptive_engine_ml import predict_next_levels
+
+    for mode in ("tree", "online"):
+        print(f"batch_inference ({mode} mode): learners/s, per-learner loop vs batched")
+        print(f"{'batch':>7} {'loop/s':>12} {'batched/s':>12} {'speedup':>8}")
+        engines_all = _random_engines(max(batch_sizes), mode=mode)
+        for n in batch_sizes:
+            engines = engines_all[:n]
+            expected = [e.predict_next_level() for e in engines]
+            assert predict_next_levels(engines) == expected, "batched result differs from per-learner path"
+            calls = max(1, 4096 // n)  # time ~4096 learners per repeat, so small batches aren't all timer noise
+            t_loop = _timeit(lambda: [[e.predict_next_level() for e in engines] for _ in range(calls)], repeat=5) / calls
+            t_batch = _timeit(lambda: [predict_next_levels(engines) for _ in range(calls)], repeat=5) / calls
+            print(f"{n:>7} {n / t_loop:>12,.0f} {n / t_batch:>12,.0f} {t_loop / t_batch:>7.1f}x")
+
+
+def bench_engine_startup(n=200):
+    """Cost of constructing n learner sessions against the shared model registry."""
+    import os
+    import tempfile
+    from adaptive_engine_ml import AdaptiveEngineML
+    from model_registry import ModelRegistry
+
+    print(f"engine_startup: {n} sessions")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.joblib")
+        registry = ModelRegistry()
+        t0 = time.perf_counter()
+        _quiet(AdaptiveEngineML, model_path=path, registry=registry)
+        t_first = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        engines = [_quiet(AdaptiveEngineML, model_path=path, registry=registry) for _ in range(n - 1)]
+        t_rest = time.perf_counter() - t0
+        assert all(e.clf is engines[0].clf for e in engines)
+    print(f"  first session (train + save): {t_first * 1000:8.1f} ms")
+    print(f"  later sessions (shared model): {t_rest / max(n - 1, 1) * 1e6:8.1f} us each")
+
+
+def bench_retrain_stall(retrain_after=30, rounds=3):
+    """Latency of the answer that triggers a retrain: inline vs background worker."""
+    import os
+    import tempfile
+    from adaptive_engine_ml import AdaptiveEngineML
+    from model_registry import ModelRegistry
+    from retrain_worker import RetrainWorker
+
+    print(f"retrain_stall: latency of the update() that triggers a retrain (every {retrain_after} answers)")
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, background in (("inline", False), ("background", True)):
+            worker = RetrainWorker()
+            eng = _quiet(AdaptiveEngineML, model_path=os.path.join(tmp, f"{label}.joblib"),
+                         registry=ModelRegistry(), retrain_after=retrain_after,
+                         background_retrain=background, retrain_worker=worker)
+            normal, trigger = [], []
+            for i in range(retrain_after * rounds):
+                t0 = time.perf_counter()
+                _quiet(eng.update, rng.random() < 0.6, rng.uniform(2, 30))
+                dt = time.perf_counter() - t0
+                (trigger if (i + 1) % retrain_after == 0 else normal).append(dt)
+                worker.wait()  # let each retrain finish before the next round
+            stats = worker.stats()
+            print(f"  {label:>10}: normal {sum(normal) / len(normal) * 1e6:8.1f} us, "
+                  f"trigger {max(trigger) * 1e3:8.2f} ms (max), "
+                  f"retrains completed {stats['completed']}")
+
+
+def bench_simulated_data(n_samples=2000, window=3, seed=43):
+    """generate_simulated_data: fresh vectorized build vs disk cache vs memory cache."""
+    import tempfile
+    import adaptive_engine_ml as aml
+
+    print(f"simulated_data: n_samples={n_samples}, window={window}")
+    old_dir = aml.SIM_CACHE_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        aml.SIM_CACHE_DIR = tmp
+        try:
+            t_fresh = _timeit(lambda: aml.generate_simulated_data(n_samples, window, seed, use_cache=False))
+            aml.generate_simulated_data(n_samples, window, seed)  # populate both caches
+
+            def from_disk():
+                aml._SIM_CACHE.clear()
+                aml.generate_simulated_data(n_samples, window, seed)
+            t_disk = _timeit(from_disk)
+            t_mem = _timeit(lambda: aml.generate_simulated_data(n_samples, window, seed))
+        finally:
+            aml.SIM_CACHE_DIR = old_dir
+            aml._SIM_CACHE.clear()
+    print(f"  fresh (vectorized): {t_fresh * 1e3:8.3f} ms")
+    print(f"  disk cache:         {t_disk * 1e3:8.3f} ms")
+    print(f"  memory cache:       {t_mem * 1e6:8.3f} us")
+
+
+def bench_online_vs_tree(n_stream=3000, n_test=5000, retrain_after=30):
+    """Per-update cost and held-out accuracy: online count tables vs tree retrain path."""
+    import numpy as np
+    from sklearn.tree import DecisionTreeClassifier
+    from adaptive_engine_ml import generate_simulated_data
+    from online_model import train_online_model
+
+    # the "real" stream and the held-out set come from different seeds than the bootstrap data
+    X_stream, y_stream = generate_simulated_data(n_stream, seed=7, use_cache=False)
+    X_test, y_test = generate_simulated_data(n_test, seed=8, use_cache=False)
+    X_sim, y_sim = generate_simulated_data(2000, seed=43)
+    rows = X_stream.tolist()
+    labels = y_stream.tolist()
+
+    def tree_path():
+        buf_X, buf_y, clf = [], [], None
+        for feat, label in zip(rows, labels):
+            buf_X.append(feat)
+            buf_y.append(label)
+            if len(buf_y) >= retrain_after:
+                clf = DecisionTreeClassifier(max_depth=6, random_state=42)
+                clf.fit(np.vstack([X_sim, np.array(buf_X)]), np.concatenate([y_sim, np.array(buf_y)]))
+                buf_X, buf_y = [], []
+        return clf
+
+    online = train_online_model()
+
+    def online_path():
+        for feat, label in zip(rows, labels):
+            online.partial_fit_one(feat, label)
+
+    t0 = time.perf_counter()
+    clf = tree_path()
+    t_tree = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    online_path()
+    t_online = time.perf_counter() - t0
+
+    acc_tree = float((clf.predict(X_test) == y_test).mean())
+    acc_online = float((online.predict(X_test) == y_test).mean())
+    print(f"online_vs_tree: {n_stream} real updates, retrain every {retrain_after}")
+    print(f"  tree retrain: {t_tree / n_stream * 1e6:8.1f} us/update (amortized), accuracy {acc_tree:.3f}")
+    print(f"  online:       {t_online / n_stream * 1e6:8.1f} us/update,             accuracy {acc_online:.3f}")
+
+
+def bench_compiled_tree(n=2000):
+    """Single-row predict: clf.predict on a 1x4 array vs the compiled lookup table."""
+    import numpy as np
+    from adaptive_engine_ml import AdaptiveEngineML
+    from tree_compiler import compile_tree, verify
+
+    eng = _quiet(AdaptiveEngineML)
+    clf = eng.clf
+    t0 = time.perf_counter()
+    compiled = compile_tree(clf, eng.window)
+    t_compile = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    mismatches = verify(compiled, clf, eng.window)
+    t_verify = time.perf_counter() - t0
+    rng = random.Random(0)
+    rows = [[rng.randint(0, 2), rng.randint(0, 3), rng.uniform(1, 40), rng.randint(0, 1)] for _ in range(n)]
+    t_sk = _timeit(lambda: [clf.predict(np.array(r).reshape(1, -1)) for r in rows], repeat=3)
+    t_ct = _timeit(lambda: [compiled.predict_one(r) for r in rows], repeat=3)
+    print(f"compiled_tree: compile {t_compile * 1e3:.2f} ms, verify {t_verify * 1e3:.1f} ms, mismatches {mismatches}")
+    print(f"  clf.predict (1 row):  {t_sk / n * 1e6:8.2f} us")
+    print(f"  compiled predict_one: {t_ct / n * 1e6:8.2f} us  ({t_sk / t_ct:.0f}x)")
+
+
+def bench_rolling_features(windows=(3, 30, 300, 3000), n=3000):
+    """update() cost as the rolling window grows (should stay flat)."""
+    import os
+    import tempfile
+    from adaptive_engine_ml import AdaptiveEngineML
+
+    print("rolling_features: update() latency vs window")
+    rng = random.Random(0)
+    attempts = [(rng.random() < 0.6, rng.uniform(2, 30)) for _ in range(n)]
+    with tempfile.TemporaryDirectory() as tmp:
+        for w in windows:
+            eng = _quiet(AdaptiveEngineML, model_path=os.path.join(tmp, f"w{w}.joblib"),
+                         window=w, retrain_after=10 ** 9)
+            t = _timeit(lambda: [eng.update(c, rt) for c, rt in attempts], repeat=3)
+            print(f"  window {w:>5}: {t / n * 1e6:8.2f} us/update")
+
+
+def bench_tracker_sink(n=50000):
+    """log_attempt cost: in-memory only vs streaming csv / jsonl sinks."""
+    import tempfile
+    from puzzle_generator import PuzzleGenerator
+    from tracker import PerformanceTracker
+
+    gen = PuzzleGenerator()
+    puzzles = [gen.generate("Medium") for _ in range(256)]
+    print(f"tracker_sink: {n} attempts")
+    with tempfile.TemporaryDirectory() as tmp:
+        for sink, retain in ((None, None), ("csv", 1000), ("jsonl", 1000)):
+            tracker = PerformanceTracker("bench", sink=sink, folder=tmp, retain=retain)
+            t0 = time.perf_counter()
+            for i in range(n):
+                tracker.log_attempt(puzzles[i % 256], i % 3 != 0, 5.0 + i % 7, "Medium")
+            t_log = time.perf_counter() - t0
+            tracker.close()
+            print(f"  {str(sink):>6}: {t_log / n * 1e6:6.2f} us/attempt, in memory: {len(tracker.attempts)}")
+
+
+def bench_attempt_store(n=1_000_000):
+    """1M attempts: list-of-dicts (old tracker) vs columnar AttemptStore - memory, append, to_dataframe."""
+    import gc
+    import tracemalloc
+    from datetime import datetime
+    import pandas as pd
+    from attempt_store import AttemptStore
+    from puzzle_generator import PuzzleGenerator
+
+    gen = PuzzleGenerator()
+    levels = ["Easy", "Medium", "Hard"]
+    puzzles = [gen.generate(levels[i % 3]) for i in range(5000)]
+
+    def fill_dicts():
+        attempts = []
+        for i in range(n):
+            p = puzzles[i % 5000]
+            attempts.append({"timestamp": datetime.utcnow().isoformat(), "user": "bench",
+                             "difficulty": levels[i % 3], "prompt": p.prompt, "answer": p.answer,
+                             "correct": bool(i % 3), "time_taken": float(i % 17)})
+        return attempts
+
+    def fill_store():
+        store = AttemptStore("bench")
+        for i in range(n):
+            p = puzzles[i % 5000]
+            store.append(time.time_ns(), levels[i % 3], p.prompt, p.answer, bool(i % 3), float(i % 17))
+        return store
+
+    print(f"attempt_store: {n:,} attempts")
+    for label, fill, to_df in (("list of dicts", fill_dicts, pd.DataFrame),
+                               ("AttemptStore", fill_store, lambda s: s.to_dataframe())):
+        gc.collect()
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        data = fill()
+        t_fill = time.perf_counter() - t0
+        mem = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        t_df = _timeit(lambda: to_df(data), repeat=3)
+        print(f"  {label:>13}: {mem / n:7.1f} B/attempt, append {t_fill / n * 1e6:5.2f} us, "
+              f"to_dataframe {t_df * 1e3:8.1f} ms")
+        del data
+
+
+def bench_summary(lengths=(10, 1000, 100_000)):
+    """print_summary cost vs session length: running stats vs full DataFrame recompute."""
+    from progress_summary import ProgressSummary
+    from puzzle_generator import PuzzleGenerator
+    from tracker import PerformanceTracker
+
+    gen = PuzzleGenerator()
+    rng = random.Random(0)
+    print("summary: print_summary latency")
+    for n in lengths:
+        tracker = PerformanceTracker("bench")
+        for _ in range(n):
+            level = rng.choice(["Easy", "Medium", "Hard"])
+            tracker.log_attempt(gen.generate(level), rng.random() < 0.6, rng.uniform(2, 25), level)
+        summary = ProgressSummary(tracker)
+        t_stats = _timeit(lambda: _quiet(summary.print_summary), repeat=3)
+        t_df = _timeit(lambda: _quiet(summary._print_summary_df), repeat=3)
+        print(f"  {n:>7} attempts: running stats {t_stats * 1e3:7.2f} ms, DataFrame {t_df * 1e3:7.2f} ms")
+
+
+def bench_puzzle_pool(n=100_000):
+    """generate() latency (per-call random draws vs. pre-generated pools) and bytes per held puzzle."""
+    import gc
+    import tracemalloc
+    from puzzle_generator import LEVELS, PooledPuzzleGenerator, PuzzleGenerator
+
+    levels = [LEVELS[i % 3] for i in range(n)]
+    plain = PuzzleGenerator()
+    pooled = PooledPuzzleGenerator(seed=0)
+    print(f"puzzle_pool: {n} generate() calls")
+    for name, gen in (("PuzzleGenerator", plain), ("PooledPuzzleGenerator", pooled)):
+        t = _timeit(lambda: [gen.generate(level) for level in levels], repeat=3)
+        print(f"  {name:<22} {t / n * 1e6:6.2f} us/puzzle")
+    pooled.close()
+    gc.collect()
+    tracemalloc.start()
+    held = [plain.generate(level) for level in levels]
+    mem = tracemalloc.get_traced_memory()[0] - sys.getsizeof(held)
+    tracemalloc.stop()
+    print(f"  {mem / n:6.1f} B per held Puzzle (prompt not rendered until read)")
+
+
+def bench_load(learners=200, answers=60):
+    """End-to-end answer path under load (see load_simulator.py for all options)."""
+    from load_simulator import format_report, run_simulation
+
+    for mode in ("tree", "online"):
+        print(format_report(run_simulation(learners, answers, mode=mode)))
+
+
+def bench_instrumentation(n=20000):
+    """Cost of the metrics hooks: a no-op under @timed, and engine.update, disabled / enabled / profiled."""
+    import instrumentation
+    from adaptive_engine_ml import AdaptiveEngineML
+
+    def noop():
+        pass
+    timed_noop = instrumentation.timed("bench.noop")(noop)
+    eng = _quiet(AdaptiveEngineML, retrain_after=10**9)
+    rng = random.Random(0)
+    attempts = [(rng.random() < 0.6, rng.uniform(2, 30)) for _ in range(n)]
+
+    def run_updates():
+        for correct, rt in attempts:
+            eng.update(correct, rt)
+
+    was_enabled = instrumentation.is_enabled()
+    print(f"instrumentation: per-call cost ({n} calls)")
+    t_plain = _timeit(lambda: [noop() for _ in range(n)], repeat=3)
+    for label, setup in (("disabled", instrumentation.disable),
+                         ("enabled", instrumentation.enable),
+                         ("profiled", lambda: instrumentation.enable(profile=["engine.update"]))):
+        setup()
+        t_noop = _timeit(lambda: [timed_noop() for _ in range(n)], repeat=3)
+        t_update = _timeit(run_updates, repeat=3)
+        print(f"  {label:>9}: hook overhead {(t_noop - t_plain) / n * 1e9:7.0f} ns, "
+              f"update() {t_update / n * 1e6:6.2f} us")
+    instrumentation.disable()
+    instrumentation._profilers.pop("engine.update", None)
+    instrumentation.METRICS.reset()
+    if was_enabled:
+        instrumentation.enable()
+
+
+def bench_snapshots(n=5000, answers=20):
+    """Engine state snapshots: save latency, log size, and open + restore_all for n learners."""
+    import os
+    import tempfile
+    from engine_snapshots import EngineSnapshotStore
+
+    engines = _random_engines(n)
+    rng = random.Random(1)
+    for eng in engines:  # partly filled retrain buffers, as in live sessions
+        eng.new_examples_X = [[1, 2, rng.uniform(2, 30), 1] for _ in range(rng.randint(0, 29))]
+        eng.new_examples_y = [1] * len(eng.new_examples_X)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snapshots.log")
+        with EngineSnapshotStore(path) as store:
+            t0 = time.perf_counter()
+            for _ in range(answers):  # one save per answer, as the app and SessionService do
+                for i, eng in enumerate(engines):
+                    store.save(f"learner{i}", eng)
+            t_save = time.perf_counter() - t0
+            compactions = store.compactions
+        size = os.path.getsize(path)
+        t0 = time.perf_counter()
+        with EngineSnapshotStore(path) as store:
+            t_open = time.perf_counter() - t0
+            restored = _quiet(store.restore_all)
+            t_restore = time.perf_counter() - t0
+    assert all(r.current_level == e.current_level for r, e in zip(restored.values(), engines))
+    print(f"snapshots: {n} learners x {answers} saves")
+    print(f"  save {t_save / (n * answers) * 1e6:6.1f} us each (incl. {compactions} auto-compactions), "
+          f"log {size / n:6.0f} B/learner")
+    print(f"  open (index) {t_open * 1e3:7.1f} ms, open + restore_all {t_restore * 1e3:7.1f} ms")
+
+
+def bench_model_persistence(n_loads=200):
+    """Versioned atomic save vs plain joblib.dump, and loading: joblib.load vs the mmapped flat tree."""
+    import os
+    import shutil
+    import tempfile
+    import joblib
+    import numpy as np
+    from adaptive_engine_ml import MODEL_PATH, train_initial_model
+    from model_registry import load_model, save_model
+
+    clf = joblib.load(MODEL_PATH) if os.path.exists(MODEL_PATH) else _quiet(train_initial_model)
+    X = np.random.default_rng(0).uniform(0, 30, (10000, 4)).round()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.joblib")
+        t_dump = _timeit(lambda: joblib.dump(clf, path), repeat=20)
+        t_save = _timeit(lambda: save_model(clf, path), repeat=20)
+        flat = load_model(path)
+        assert (flat.predict(X) == clf.predict(X)).all(), "flat tree predicts differently"
+        legacy = os.path.join(tmp, "legacy.joblib")
+        shutil.copyfile(path, legacy)
+        t_joblib = _timeit(lambda: [joblib.load(legacy) for _ in range(n_loads)], repeat=3) / n_loads
+        t_flat = _timeit(lambda: [load_model(path) for _ in range(n_loads)], repeat=3) / n_loads
+    print("model_persistence:")
+    print(f"  save: joblib.dump {t_dump * 1e3:6.2f} ms, versioned atomic save_model {t_save * 1e3:6.2f} ms")
+    print(f"  load: joblib.load {t_joblib * 1e3:6.3f} ms, flat tree (mmap) {t_flat * 1e3:6.3f} ms")
+
+
+def bench_policy_replay(sessions=50_000, check_sessions=200):
+    """policy_replay over ~1M synthetic attempts; trajectories checked against the engines run one by one."""
+    import numpy as np
+    from adaptive_engine_ml import LEVELS, AdaptiveEngineML
+    from main import AdaptiveEngine
+    from policy_replay import Attempts, replay
+
+    rng = np.random.default_rng(0)
+    session = np.repeat(np.arange(sessions), rng.integers(5, 36, sessions))
+    n = len(session)
+    attempts = Attempts(session, rng.integers(0, 3, n), rng.random(n) < 0.65, rng.gamma(3.0, 4.0, n).round(2))
+    _quiet(replay, Attempts([0], [0], [True], [5.0]))  # load + compile the model outside the timing
+    t0 = time.perf_counter()
+    result = _quiet(replay, attempts)
+    elapsed = time.perf_counter() - t0
+
+    mismatches = 0
+    for s in range(check_sessions):
+        rows = np.flatnonzero(attempts.session == s)
+        start = LEVELS[attempts.level[rows[0]]]
+        rule = AdaptiveEngine(start)
+        ml = _quiet(AdaptiveEngineML, start, retrain_after=10 ** 9, background_retrain=False)
+        for i in rows.tolist():
+            mismatches += LEVELS[result.levels["rule"][i]] != rule.current_level
+            mismatches += LEVELS[result.levels["ml"][i]] != ml.current_level
+            rule.update(bool(attempts.correct[i]), float(attempts.time[i]))
+            ml.update(bool(attempts.correct[i]), float(attempts.time[i]))
+    print(f"policy_replay: {n:,} attempts, {sessions:,} sessions, {len(result.levels) - 1} policies")
+    print(f"  replay: {elapsed:.2f} s ({n / elapsed / 1e6:.2f} M attempts/s)")
+    print(f"  mismatches vs. sequential engines ({check_sessions} sessions): {mismatches}")
+    assert mismatches == 0, "vectorized replay disagrees with the engines"
+
+
+def bench_personal_models(learners=2000, sessions=6000, answers=15, max_bytes=4 << 20):
+    """
+    Per-learner models: update latency vs. the shared model and cache memory under a byte budget,
+    with sessions of random learners (most of them evicted and reloaded between sessions).
+    """
+    import tempfile
+    import numpy as np
+    from adaptive_engine_ml import AdaptiveEngineML
+    from personal_models import PersonalModelCache
+    from retrain_worker import RetrainWorker
+
+    rng = random.Random(0)
+    paces = [rng.uniform(0.5, 2.0) for _ in range(learners)]
+    order = [rng.randrange(learners) for _ in range(sessions)]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = PersonalModelCache(max_bytes=max_bytes, folder=tmp)
+        worker = RetrainWorker()
+        results = {}
+        for label, personal in (("shared", None), ("personal", cache)):
+            lat = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                for i in order:
+                    key = f"learner{i}" if personal is not None else None
+                    eng = AdaptiveEngineML(retrain_after=10 ** 9, retrain_worker=worker, personal=personal, personal_key=key)
+                    for _ in range(answers):
+                        t = paces[i] * rng.uniform(4.0, 14.0)
+                        t0 = time.perf_counter()
+                        eng.update(rng.random() < 0.75, t)
+                        lat.append(time.perf_counter() - t0)
+                worker.wait()
+            results[label] = np.array(lat) * 1e6
+        stats = cache.stats()
+        cache.close()
+    print(f"personal_models: {learners} learners, {sessions} sessions x {answers} answers, "
+          f"cache budget {max_bytes / 2**20:.0f} MiB")
+    for label, lat in results.items():
+        print(f"  {label:8s} update: mean {lat.mean():7.1f} us, p50 {np.percentile(lat, 50):6.1f} us, "
+              f"p99 {np.percentile(lat, 99):8.1f} us")
+    print(f"  cache: {stats['models']} resident ({stats['nbytes'] / 2**20:.2f} MiB), {stats['fits']} fits, "
+          f"{stats['evicted']} evicted, {stats['saved']} saved, {stats['loaded']} reloaded")
+
+def bench_app_rerun(history=(0, 1_000, 100_000), submits=20):
+    """
+    Streamlit server time per submit and for the final screen, for sessions whose tracker
+    already holds `history` attempts. Driven through streamlit's AppTest, which reruns the whole
+    script where a browser would rerun only the question fragment, so submit times are an upper bound.
+    """
+    import os
+    import numpy as np
+    from streamlit.testing.v1 import AppTest
+    from puzzle_generator import PuzzleGenerator
+
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    pg = PuzzleGenerator()
+    print(f"app_rerun: server time per rerun (AppTest, {submits} submits)")
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = []
+        for n in (0,) + tuple(history):  # the first session only warms up imports of the table renderers
+            at = AppTest.from_file(app, default_timeout=120).run()
+            at.text_input[0].input(f"bench{n}")
+            at.number_input[0].set_value(submits)
+            at.button[0].click()
+            at.run()
+            tracker = at.session_state["tracker"]
+            for i in range(n):  # a long session so far
+                puzzle = pg.generate("Easy")
+                tracker.log_attempt(puzzle, i % 3 != 0, 5.0 + i % 7, "Easy")
+            lat = []
+            for r in range(1, submits + 1):
+                at.text_input(key=f"answer_{r}").input(str(at.session_state["puzzle"].answer))
+                at.button[0].click()
+                t0 = time.perf_counter()
+                at.run()
+                lat.append(time.perf_counter() - t0)
+            final = lat.pop()  # the last submit draws the final screen
+            t0 = time.perf_counter()
+            at.run()  # any later rerun of the final screen: cached report
+            rerun = time.perf_counter() - t0
+            rows.append((n, np.median(lat), final, rerun))
+    for n, submit, final, rerun in rows[1:]:
+        print(f"  {n:>7,} earlier attempts: submit {submit * 1e3:6.1f} ms, final screen {final * 1e3:7.1f} ms, "
+              f"final screen rerun {rerun * 1e3:6.1f} ms")
+
+
+HEAVY_MODULES = ("sklearn", "scipy", "pandas", "joblib")
+
+# learner flow in a fresh interpreter: import, build an engine on a saved model, answer once
+_COLD_START = """
+import sys, time
+t0 = time.perf_counter()
+{eager}
+import adaptive_engine_ml, engine_snapshots, progress_summary, puzzle_generator, session_service, tracker
+engine = adaptive_engine_ml.AdaptiveEngineML(model_path=sys.argv[1])
+engine.update(True, 5.0)
+print(time.perf_counter() - t0, ",".join(m for m in {heavy!r} if m in sys.modules), sep="|")
+"""
+
+# first screen of the Streamlit app in a fresh interpreter
+_PAGE_START = """
+import sys, time
+t0 = time.perf_counter()
+{eager}
+from streamlit.testing.v1 import AppTest
+AppTest.from_file("app.py").run(timeout=60)
+print(time.perf_counter() - t0, ",".join(m for m in {heavy!r} if m in sys.modules), sep="|")
+"""
+
+# what the learner flow used to import up front
+_EAGER = "import joblib, pandas, sklearn.metrics, sklearn.model_selection, sklearn.tree"
+
+
+def bench_cold_start(repeat=3):
+    """
+    Process cold start with lazy heavy imports vs. importing them up front, and a guard:
+    the learner flow on a saved model and the app's first screen must not import sklearn/pandas.
+    """
+    import os
+    import subprocess
+    import tempfile
+    from adaptive_engine_ml import MODEL_PATH, train_initial_model
+    from model_registry import load_model, save_model
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    clf = load_model(MODEL_PATH) if os.path.exists(MODEL_PATH) else _quiet(train_initial_model)
+
+    def run(script, eager, *args):
+        best, loaded = None, ""
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, "-W", "ignore", "-c",
+                                  script.format(eager=eager, heavy=HEAVY_MODULES), *args],
+                                 cwd=here, capture_output=True, text=True, check=True).stdout
+            t_total, loaded = out.splitlines()[-1].split("|")
+            if best is None or float(t_total) < best:
+                best = float(t_total)
+        return best, loaded
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.joblib")
+        save_model(clf, path)
+        print(f"cold_start (fresh interpreter, best of {repeat}):")
+        for label, script, args in (("learner flow", _COLD_START, (path,)), ("app first screen", _PAGE_START, ())):
+            lazy, loaded = run(script, "", *args)
+            eager, _ = run(script, _EAGER, *args)
+            print(f"  {label:16s} lazy {lazy * 1e3:7.1f} ms, eager {eager * 1e3:7.1f} ms "
+                  f"({eager / lazy:4.1f}x)")
+            assert not loaded, f"{label} imported {loaded}"
+
+
+BENCHMARKS = {
+    "batch_inference": bench_batch_inference,
+    "engine_startup": bench_engine_startup,
+    "retrain_stall": bench_retrain_stall,
+    "simulated_data": bench_simulated_data,
+    "online_vs_tree": bench_online_vs_tree,
+    "compiled_tree": bench_compiled_tree,
+    "rolling_features": bench_rolling_features,
+    "tracker_sink": bench_tracker_sink,
+    "attempt_store": bench_attempt_store,
+    "summary": bench_summary,
+    "puzzle_pool": bench_puzzle_pool,
+    "load": bench_load,
+    "instrumentation": bench_instrumentation,
+    "snapshots": bench_snapshots,
+    "model_persistence": bench_model_persistence,
+    "policy_replay": bench_policy_replay,
+    "personal_models": bench_personal_models,
+    "cold_start": bench_cold_start,
+    "app_rerun": bench_app_rerun,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark {name!r}; choose from: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        BENCHMARKS[name]()
+        print()
@@ -0,0 +1,339 @@
+"""
+Cohort-scale analytics over the session logs in logs/.
+
+    python cohort_analytics.py [logs_dir] [--workers N] [--out-prefix PATH]
+
+- Every *.csv written by PerformanceTracker.save_csv (or its csv sink) is
+  parsed in chunks in a process pool into small per-file partial
+  aggregates: per (user, difficulty) attempts / correct / time sum plus a
+  log-spaced latency histogram, and per (user, from, to) level transition
+  counts.
+- The partials are cached in one compact columnar file
+  (<logs_dir>/.cohort_cache.npz, users/difficulties as integer codes)
+  together with each file's size and mtime, so later runs only parse new
+  or changed CSVs and drop rows of deleted ones.
+- Reports (per user, per difficulty, transitions) are merged from the
+  cached partials. Latency percentiles come from the histograms, so they
+  are accurate to one bin (~7% of the value).
+"""
+
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+CACHE_NAME = ".cohort_cache.npz"
+CACHE_VERSION = 1
+CHUNK_ROWS = 100_000
+# histogram bins: [0, 0.1), then 120 log-spaced bins up to 600 s, then >= 600 s
+LATENCY_EDGES = np.geomspace(0.1, 600.0, 121)
+N_BINS = len(LATENCY_EDGES) + 1
+USECOLS = ["user", "difficulty", "correct", "time_taken"]
+
+
+def _as_bool(col):
+    if col.dtype == bool:
+        return col.to_numpy()
+    return col.astype(str).str.lower().isin(["true", "1"]).to_numpy()
+
+
+def read_chunks(path, columns, chunk_rows=CHUNK_ROWS):
+    """
+    The given columns of one session CSV, chunk by chunk. Empty files (a csv
+    sink that crashed before its first flush) and unparseable ones are
+    skipped with a warning instead of aborting the whole run.
+    """
+    try:
+        yield from pd.read_csv(path, usecols=lambda c: c in columns, chunksize=chunk_rows)
+    except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError) as e:
+        print(f"⚠️ Skipping unreadable session log {path}:", e)
+
+
+def aggregate_file(path, chunk_rows=CHUNK_ROWS):
+    """
+    Partial aggregates for one session CSV, reading it chunk by chunk.
+    Returns (groups, transitions):
+      groups:      {(user, difficulty): [attempts, correct, time_sum, histogram]}
+      transitions: {(user, from_difficulty, to_difficulty): count}
+    """
+    groups, transitions = {}, {}
+    last = {}  # user -> difficulty of the previous attempt (carried across chunks)
+    for chunk in read_chunks(path, USECOLS, chunk_rows):
+        if chunk.empty or not set(USECOLS) <= set(chunk.columns):
+            continue
+        users = chunk["user"].astype(str).to_numpy()
+        diffs = chunk["difficulty"].astype(str).to_numpy()
+        correct = _as_bool(chunk["correct"])
+        times = pd.to_numeric(chunk["time_taken"], errors="coerce").fillna(0.0).to_numpy()
+        bins = np.searchsorted(LATENCY_EDGES, times, side="right")
+
+        keys = pd.MultiIndex.from_arrays([users, diffs])
+        codes, uniques = pd.factorize(keys)
+        for k, (user, diff) in enumerate(uniques):
+            mask = codes == k
+            g = groups.get((user, diff))
+            if g is None:
+                g = groups[(user, diff)] = [0, 0, 0.0, np.zeros(N_BINS, dtype=np.int64)]
+            g[0] += int(mask.sum())
+            g[1] += int(correct[mask].sum())
+            g[2] += float(times[mask].sum())
+            g[3] += np.bincount(bins[mask], minlength=N_BINS)
+
+        # level transitions between consecutive attempts of the same user
+        for user in pd.unique(users):
+            seq = diffs[users == user]
+            prev = last.get(user)
+            if prev is not None:
+                seq = np.concatenate([[prev], seq])
+            if len(seq) > 1:
+                seq_codes, names = pd.factorize(seq)
+                k = len(names)
+                counts = np.bincount(seq_codes[:-1] * k + seq_codes[1:], minlength=k * k)
+                for idx in np.flatnonzero(counts):
+                    key = (user, names[idx // k], names[idx % k])
+                    transitions[key] = transitions.get(key, 0) + int(counts[idx])
+            last[user] = seq[-1]
+    return groups, transitions
+
+
+def _empty_cache():
+    return {
+        "files": np.array([], dtype=str), "sizes": np.array([], dtype=np.int64),
+        "mtimes": np.array([], dtype=np.int64),
+        "users": np.array([], dtype=str), "difficulties": np.array([], dtype=str),
+        "g_file": np.array([], dtype=np.int32), "g_user": np.array([], dtype=np.int32),
+        "g_diff": np.array([], dtype=np.int16), "g_attempts": np.array([], dtype=np.int64),
+        "g_correct": np.array([], dtype=np.int64), "g_time": np.array([], dtype=np.float64),
+        "g_hist": np.zeros((0, N_BINS), dtype=np.int64),
+        "t_file": np.array([], dtype=np.int32), "t_user": np.array([], dtype=np.int32),
+        "t_src": np.array([], dtype=np.int16), "t_dst": np.array([], dtype=np.int16),
+        "t_count": np.array([], dtype=np.int64),
+    }
+
+
+def load_cache(path):
+    if not os.path.exists(path):
+        return _empty_cache()
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != CACHE_VERSION:
+                return _empty_cache()
+            return {k: data[k] for k in _empty_cache()}
+    except Exception:
+        return _empty_cache()  # unreadable cache: rebuild from the CSVs
+
+
+def save_cache(path, cache):
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp, version=CACHE_VERSION, **cache)
+    os.replace(tmp, path)
+
+
+def _compact(cache, keep_files, new_results):
+    """
+    Rebuild the cache arrays: keep rows of files in keep_files, drop rows
+    of deleted/changed files, and append partials for new/changed files.
+    User/difficulty name tables only ever grow, so old codes stay valid.
+    """
+    users = {u: i for i, u in enumerate(cache["users"].tolist())}
+    diffs = {d: i for i, d in enumerate(cache["difficulties"].tolist())}
+
+    def code(table, name):
+        c = table.get(name)
+        if c is None:
+            c = table[name] = len(table)
+        return c
+
+    # old rows: vectorized filter + file renumbering
+    old_files = cache["files"].tolist()
+    kept = np.array([f in keep_files for f in old_files], dtype=bool)
+    remap = np.full(len(old_files), -1, dtype=np.int32)
+    remap[kept] = np.arange(int(kept.sum()), dtype=np.int32)
+    out = {}
+    for prefix, cols in (("g_", ("user", "diff", "attempts", "correct", "time", "hist")),
+                         ("t_", ("user", "src", "dst", "count"))):
+        file_idx = cache[prefix + "file"]
+        rows = remap[file_idx] >= 0 if len(file_idx) else np.zeros(0, dtype=bool)
+        out[prefix + "file"] = [remap[file_idx[rows]]]
+        for c in cols:
+            out[prefix + c] = [cache[prefix + c][rows]]
+    files = [f for f, k in zip(old_files, kept) if k]
+    sizes = cache["sizes"][kept].tolist()
+    mtimes = cache["mtimes"][kept].tolist()
+
+    # new rows
+    g = {k: [] for k in ("file", "user", "diff", "attempts", "correct", "time", "hist")}
+    t = {k: [] for k in ("file", "user", "src", "dst", "count")}
+    for (name, size, mtime), (groups, trans) in new_results:
+        fi = len(files)
+        files.append(name)
+        sizes.append(size)
+        mtimes.append(mtime)
+        for (user, diff), (n, c, tsum, hist) in groups.items():
+            g["file"].append(fi)
+            g["user"].append(code(users, user))
+            g["diff"].append(code(diffs, diff))
+            g["attempts"].append(n)
+            g["correct"].append(c)
+            g["time"].append(tsum)
+            g["hist"].append(hist)
+        for (user, src, dst), n in trans.items():
+            t["file"].append(fi)
+            t["user"].append(code(users, user))
+            t["src"].append(code(diffs, src))
+            t["dst"].append(code(diffs, dst))
+            t["count"].append(n)
+
+    empty = _empty_cache()
+    for prefix, new in (("g_", g), ("t_", t)):
+        for c, values in new.items():
+            key = prefix + c
+            dtype = empty[key].dtype
+            if c == "hist":
+                arr = np.array(values, dtype=dtype).reshape(-1, N_BINS)
+            else:
+                arr = np.array(values, dtype=dtype)
+            out[key] = np.concatenate(out[key] + [arr]).astype(dtype, copy=False)
+
+    out.update({
+        "files": np.array(files, dtype=str), "sizes": np.array(sizes, dtype=np.int64),
+        "mtimes": np.array(mtimes, dtype=np.int64),
+        "users": np.array(list(users), dtype=str), "difficulties": np.array(list(diffs), dtype=str),
+    })
+    return out
+
+
+def _stat_file(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def update_cache(folder="logs", workers=None, cache_path=None):
+    """
+    Bring the cache for folder up to date, parsing only new/changed CSVs.
+    Returns (cache, n_parsed).
+    """
+    cache_path = cache_path or os.path.join(folder, CACHE_NAME)
+    cache = load_cache(cache_path)
+    known = {f: (int(s), int(m)) for f, s, m in zip(cache["files"].tolist(), cache["sizes"], cache["mtimes"])}
+
+    current = {}
+    for path in sorted(glob.glob(os.path.join(folder, "*.csv"))):
+        current[os.path.basename(path)] = _stat_file(path)
+    keep = {f for f, meta in current.items() if known.get(f) == meta}
+    todo = [f for f in current if f not in keep]
+    dropped = set(known) - keep
+
+    if not todo and not dropped:
+        return cache, 0
+
+    paths = [os.path.join(folder, f) for f in todo]
+    if len(paths) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(aggregate_file, paths, chunksize=max(1, len(paths) // 64)))
+    else:
+        results = [aggregate_file(p) for p in paths]
+
+    new_results = [((f, *current[f]), r) for f, r in zip(todo, results)]
+    cache = _compact(cache, keep, new_results)
+    save_cache(cache_path, cache)
+    return cache, len(todo)
+
+
+def _percentiles(hist, qs=(50, 90, 99)):
+    """Approximate percentiles from a latency histogram (linear within a bin)."""
+    total = hist.sum()
+    if not total:
+        return [float("nan")] * len(qs)
+    lower = np.concatenate([[0.0], LATENCY_EDGES])
+    upper = np.concatenate([LATENCY_EDGES, [LATENCY_EDGES[-1]]])
+    cum = np.cumsum(hist)
+    out = []
+    for q in qs:
+        target = q / 100.0 * total
+        b = int(np.searchsorted(cum, target, side="left"))
+        before = cum[b - 1] if b else 0
+        frac = (target - before) / hist[b] if hist[b] else 0.0
+        out.append(float(lower[b] + frac * (upper[b] - lower[b])))
+    return out
+
+
+def _report(names, codes, cache, label):
+    k = len(names)
+    attempts = np.bincount(codes, weights=cache["g_attempts"], minlength=k)
+    correct = np.bincount(codes, weights=cache["g_correct"], minlength=k)
+    time_sum = np.bincount(codes, weights=cache["g_time"], minlength=k)
+    hists = np.zeros((k, N_BINS), dtype=np.int64)
+    np.add.at(hists, codes, cache["g_hist"])
+    rows = []
+    for i in np.flatnonzero(attempts):
+        n = int(attempts[i])
+        p50, p90, p99 = _percentiles(hists[i])
+        rows.append({
+            label: names[i],
+            "attempts": n,
+            "accuracy": correct[i] / n * 100,
+            "avg_time": time_sum[i] / n,
+            "p50_time": p50,
+            "p90_time": p90,
+            "p99_time": p99,
+        })
+    return pd.DataFrame(rows, columns=[label, "attempts", "accuracy", "avg_time", "p50_time", "p90_time", "p99_time"])
+
+
+def per_user(cache):
+    return _report(cache["users"].tolist(), cache["g_user"], cache, "user")
+
+
+def per_difficulty(cache):
+    return _report(cache["difficulties"].tolist(), cache["g_diff"], cache, "difficulty")
+
+
+def transitions(cache):
+    """Level transition counts across the cohort as a from x to table."""
+    diffs = cache["difficulties"].tolist()
+    df = pd.DataFrame({
+        "from": [diffs[i] for i in cache["t_src"]],
+        "to": [diffs[i] for i in cache["t_dst"]],
+        "count": cache["t_count"],
+    })
+    if df.empty:
+        return df
+    return df.pivot_table(index="from", columns="to", values="count", aggfunc="sum", fill_value=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cohort analytics over session logs")
+    parser.add_argument("folder", nargs="?", default="logs")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (1 = no pool)")
+    parser.add_argument("--out-prefix", default=None,
+                        help="also write <prefix>_users.csv / _difficulty.csv / _transitions.csv")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.folder):
+        print(f"❌ No such folder: {args.folder}")
+        return 1
+    cache, parsed = update_cache(args.folder, workers=args.workers)
+    print(f"📂 {len(cache['files'])} session logs ({parsed} parsed this run)")
+
+    users, diffs, trans = per_user(cache), per_difficulty(cache), transitions(cache)
+    fmt = '{:,.2f}'.format
+    print(f"\n👥 Learners: {len(users)}")
+    print("\nPerformance by difficulty:")
+    print(diffs.to_string(index=False, float_format=fmt))
+    print("\nLevel transitions (from -> to):")
+    print(trans.to_string() if not trans.empty else "none")
+    if args.out_prefix:
+        users.to_csv(f"{args.out_prefix}_users.csv", index=False)
+        diffs.to_csv(f"{args.out_prefix}_difficulty.csv", index=False)
+        trans.to_csv(f"{args.out_prefix}_transitions.csv")
+        print(f"\n💾 Reports written to {args.out_prefix}_*.csv")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""
+Crash-safe snapshots of per-learner AdaptiveEngineML state.
+
+- A snapshot holds only what the learner owns: current level, the rolling
+  history window and the pending retrain buffer. The model is never copied;
+  restored engines pick up the shared one from the registry.
+- Snapshots are appended to a single binary log (one small record per
+  save, latest record per learner wins). Each record is framed as
+  magic | payload length | CRC32 | payload, so a torn write at the end of
+  the file (crash mid-append) is detected on open and cut off; earlier
+  records are never rewritten.
+- Opening the store scans the log once and keeps only an in-memory index
+  learner -> (offset, length) of each learner's latest record. restore()
+  reads one record; load() / restore_all() parse every latest record,
+  which takes milliseconds for thousands of learners.
+- compact() rewrites the log with the latest record per learner into a
+  temp file and swaps it in with os.replace(). It runs on its own (on open
+  and after a save) once superseded / deleted records outnumber live ones
+  by compact_ratio (and there are at least COMPACT_MIN_DEAD of them), so
+  the log stays within a constant factor of the live state however many
+  answers are saved.
+
+Record payload (little endian):
+    kind u8 (1 = state, 2 = deleted) | key length u16 | level i8 | window u16
+    | history length u16 | pending rows u32 | time sum f64 | correct sum u32
+    | pushes since resync u32 | key utf-8
+    | history correct u8[n] | history time f64[n] | pending X f64[m*4] | pending y i8[m]
+"""
+
+import os
+import struct
+import threading
+import zlib
+from collections import deque
+
+import numpy as np
+
+from adaptive_engine_ml import LEVELS, AdaptiveEngineML
+
+SNAPSHOT_PATH = os.path.join(".cache", "engine_snapshots.log")
+MAGIC = b"ES"
+HEADER = struct.Struct("<2sII")       # magic, payload length, crc32(payload)
+# kind, key length, level, window, history length, pending rows, time sum, correct sum, pushes since resync
+FIXED = struct.Struct("<BHbHHIdII")
+STATE, DELETED = 1, 2
+N_FEATURES = 4
+COMPACT_MIN_DEAD = 1024  # don't bother compacting small logs
+
+
+class EngineState:
+    """Decoded snapshot of one learner's engine."""
+
+    __slots__ = ("level", "window", "history", "sums", "pending_X", "pending_y")
+
+    def __init__(self, level, window, history, sums, pending_X, pending_y):
+        self.level = level            # "Easy" / "Medium" / "Hard"
+        self.window = window
+        self.history = history        # [(correct, response_time)], oldest first
+        self.sums = sums              # engine running sums (time, correct, pushes since resync)
+        self.pending_X = pending_X    # retrain buffer rows, (m, 4) array or list of rows
+        self.pending_y = pending_y
+
+    @classmethod
+    def from_engine(cls, engine):
+        sums = (engine._time_sum, engine._correct_sum, engine._pushes_since_resync)
+        return cls(engine.current_level, engine.window, list(engine.history), sums,
+                   engine.new_examples_X, engine.new_examples_y)
+
+    def apply(self, engine):
+        """Load this state into engine (its window must match)."""
+        if engine.window != self.window:
+            raise ValueError(f"Snapshot window {self.window} != engine window {engine.window}")
+        engine.current_level = self.level
+        engine.history = deque(self.history, maxlen=engine.window)
+        # the saved running sums, not a re-sum, so a resumed engine predicts bit for bit the same
+        engine._time_sum, engine._correct_sum, engine._pushes_since_resync = self.sums
+        X = self.pending_X
+        engine.new_examples_X = X.tolist() if isinstance(X, np.ndarray) else [list(row) for row in X]
+        engine.new_examples_y = list(self.pending_y)
+        return engine
+
+
+def encode(key, state, kind=STATE):
+    """One framed record for state (kind=DELETED writes a tombstone for key)."""
+    key_bytes = key.encode("utf-8")
+    n, m = len(state.history), len(state.pending_y)
+    parts = [FIXED.pack(kind, len(key_bytes), LEVELS.index(state.level), state.window, n, m, *state.sums),
+             key_bytes]
+    if n:
+        parts.append(bytes(1 if c else 0 for c, _ in state.history))
+        parts.append(struct.pack(f"<{n}d", *(t for _, t in state.history)))
+    if m:
+        parts.append(struct.pack(f"<{m * N_FEATURES}d", *(v for row in state.pending_X for v in row)))
+        parts.append(struct.pack(f"<{m}b", *state.pending_y))
+    payload = b"".join(parts)
+    return HEADER.pack(MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode_key(payload):
+    kind, key_len = FIXED.unpack_from(payload)[:2]
+    return kind, payload[FIXED.size:FIXED.size + key_len].decode("utf-8")
+
+
+def decode(payload):
+    """(kind, key, EngineState or None) from a record payload (CRC already checked)."""
+    kind, key_len, level, window, n, m, *sums = FIXED.unpack_from(payload)
+    pos = FIXED.size
+    key = payload[pos:pos + key_len].decode("utf-8")
+    if kind != STATE:
+        return kind, key, None
+    pos += key_len
+    correct = payload[pos:pos + n]
+    pos += n
+    times = struct.unpack_from(f"<{n}d", payload, pos)
+    pos += 8 * n
+    X = np.frombuffer(payload, dtype="<f8", count=m * N_FEATURES, offset=pos).reshape(m, N_FEATURES)
+    pos += 8 * m * N_FEATURES
+    y = struct.unpack_from(f"<{m}b", payload, pos)
+    history = [(bool(c), t) for c, t in zip(correct, times)]
+    return kind, key, EngineState(LEVELS[level], window, history, tuple(sums), X, y)
+
+
+class EngineSnapshotStore:
+    def __init__(self, path=SNAPSHOT_PATH, fsync=False, compact_ratio=1.0):
+        """
+        fsync=True also forces every save to disk (survives power loss, costs a disk flush).
+        compact_ratio: compact once dead records exceed this many per live one (None = only on compact()).
+        """
+        self.path = path
+        self.fsync = fsync
+        self.compact_ratio = compact_ratio
+        self._lock = threading.Lock()
+        self._index = {}  # key -> (payload offset, payload length) of the latest state record
+        self.dead_records = 0
+        self.compactions = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._recover()
+        self._fh = open(path, "ab")
+        with self._lock:
+            if self._compaction_due():
+                self._compact()
+
+    def _scan(self, data):
+        """Yield (record offset, payload offset, payload length) for every intact record."""
+        pos, size = 0, len(data)
+        while pos + HEADER.size <= size:
+            magic, length, crc = HEADER.unpack_from(data, pos)
+            start = pos + HEADER.size
+            if magic != MAGIC or start + length > size or zlib.crc32(data[start:start + length]) != crc:
+                return
+            yield pos, start, length
+            pos = start + length
+
+    def _recover(self):
+        """Build the index and cut off a torn / corrupt tail left by a crash."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            data = f.read()
+        end = 0
+        for _, start, length in self._scan(data):
+            kind, key = _decode_key(data[start:start + length])
+            if key in self._index:
+                self.dead_records += 1
+            if kind == STATE:
+                self._index[key] = (start, length)
+            else:
+                self._index.pop(key, None)
+                self.dead_records += 1
+            end = start + length
+        if end < len(data):
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def keys(self):
+        return list(self._index)
+
+    def _append(self, key, record, kind):
+        with self._lock:
+            offset = self._fh.tell()
+            self._fh.write(record)
+            self._fh.flush()
+            if self.fsync:
+                os.fsync(self._fh.fileno())
+            if key in self._index:
+                self.dead_records += 1
+            if kind == STATE:
+                self._index[key] = (offset + HEADER.size, len(record) - HEADER.size)
+            else:
+                self._index.pop(key, None)
+                self.dead_records += 1
+            if self._compaction_due():
+                self._compact()
+
+    def _compaction_due(self):
+        return (self.compact_ratio is not None and self.dead_records >= COMPACT_MIN_DEAD
+                and self.dead_records > self.compact_ratio * len(self._index))
+
+    def save(self, key, engine):
+        """Append a snapshot of engine's learner state under key."""
+        self._append(key, encode(key, EngineState.from_engine(engine)), STATE)
+
+    def delete(self, key):
+        if key in self._index:
+            self._append(key, encode(key, EngineState(LEVELS[0], 0, [], (0.0, 0, 0), [], []), DELETED), DELETED)
+
+    def get(self, key):
+        """Latest EngineState for key, or None."""
+        with self._lock:  # a save may compact the log, which moves every record
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            self._fh.flush()
+            with open(self.path, "rb") as f:
+                f.seek(entry[0] - HEADER.size)
+                record = f.read(HEADER.size + entry[1])
+        if len(record) < HEADER.size:
+            return None
+        magic, length, crc = HEADER.unpack_from(record)
+        payload = record[HEADER.size:]
+        if magic != MAGIC or length != len(payload) or zlib.crc32(payload) != crc:
+            return None
+        kind, found, state = decode(payload)
+        return state if kind == STATE and found == key else None
+
+    def load(self):
+        """{key: EngineState} for every learner, from one read of the log."""
+        with self._lock:
+            self._fh.flush()
+            with open(self.path, "rb") as f:
+                data = f.read()
+            index = list(self._index.items())
+        return {key: decode(data[start:start + length])[2] for key, (start, length) in index}
+
+    def restore(self, key, **engine_kwargs):
+        """A new AdaptiveEngineML carrying key's saved state (None if there is none)."""
+        state = self.get(key)
+        if state is None:
+            return None
+        return state.apply(AdaptiveEngineML(window=state.window, **engine_kwargs))
+
+    def restore_all(self, **engine_kwargs):
+        """{key: engine} for every saved learner; all engines share the registry's model."""
+        return {key: state.apply(AdaptiveEngineML(window=state.window, **engine_kwargs))
+                for key, state in self.load().items()}
+
+    def compact(self):
+        """Rewrite the log with only the latest record per learner."""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        self._fh.flush()
+        with open(self.path, "rb") as f:
+            data = f.read()
+        tmp = self.path + ".tmp"
+        index = {}
+        with open(tmp, "wb") as out:
+            for key, (start, length) in self._index.items():
+                out.write(data[start - HEADER.size:start + length])
+                index[key] = (out.tell() - length, length)
+            out.flush()
+            os.fsync(out.fileno())
+        self._fh.close()
+        os.replace(tmp, self.path)
+        self._fh = open(self.path, "ab")
+        self._index = index
+        self.dead_records = 0
+        self.compactions += 1
+
+    def close(self):
+        with self._lock:
+            if not self._fh.closed:
+                self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,253 @@
+"""
+Lightweight metrics for the adaptive learning hot paths.
+
+- One process-wide registry (METRICS) of named counters and latency
+  histograms. Stages are wrapped with @timed("stage") or
+  `with timer("stage"):`; events are counted with count("name").
+- Off by default. While disabled a timed call costs a single flag check,
+  so the hooks stay on the hot path permanently; enable() (or
+  ADAPTIVE_METRICS=1 in the environment) switches recording on at runtime.
+- enable(profile=["engine.update", ...]) also runs those stages under a
+  per-stage cProfile.Profile; profile_report(stage) prints the top
+  functions. Only one stage is profiled at a time (cProfile cannot nest),
+  calls that would overlap are just timed.
+- Export with to_prometheus() (text exposition format, histograms as
+  cumulative `le` buckets) or to_json(); streamlit_panel() shows the same
+  numbers in a Streamlit app.
+"""
+
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+# histogram bucket upper bounds in seconds: 1 us .. 10 s, 4 per decade (+Inf implied)
+BUCKETS = tuple(10 ** (e / 4) for e in range(-24, 5))
+
+_enabled = os.environ.get("ADAPTIVE_METRICS", "") not in ("", "0")
+_profilers = {}  # stage -> cProfile.Profile, for stages passed to enable(profile=...)
+_profile_lock = threading.Lock()
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            h = self.histograms.get(stage)
+            if h is None:
+                h = self.histograms[stage] = Histogram()
+            h.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """Plain-dict view: counters, and per stage count / sum / max / p50 / p95 / p99 in seconds."""
+        with self._lock:
+            stages = {}
+            for stage, h in sorted(self.histograms.items()):
+                stages[stage] = {
+                    "count": h.count,
+                    "sum_s": h.sum,
+                    "max_s": h.max,
+                    "p50_s": h.quantile(0.50),
+                    "p95_s": h.quantile(0.95),
+                    "p99_s": h.quantile(0.99),
+                    "buckets": dict(zip([*map(repr, BUCKETS), "+Inf"], h.counts)),
+                }
+            return {"counters": dict(sorted(self.counters.items())), "stages": stages}
+
+    def to_json(self, indent=None):
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix="adaptive"):
+        lines = [f"# TYPE {prefix}_events_total counter"]
+        with self._lock:
+            for name, n in sorted(self.counters.items()):
+                lines.append(f'{prefix}_events_total{{name="{name}"}} {n}')
+            lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS, h.counts):
+                    cumulative += n
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {h.sum:.9g}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def enable(profile=()):
+    """Start recording; stages listed in profile are also run under cProfile."""
+    global _enabled
+    for stage in profile:
+        _profilers.setdefault(stage, cProfile.Profile())
+    _enabled = True
+
+
+def disable():
+    """Stop recording (collected metrics and profiles are kept)."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def count(name, n=1):
+    if _enabled:
+        METRICS.inc(name, n)
+
+
+def observe(stage, seconds):
+    """Record a duration measured elsewhere (e.g. by the retrain worker)."""
+    if _enabled:
+        METRICS.observe(stage, seconds)
+
+
+def _run(stage, fn, args, kwargs):
+    prof = _profilers.get(stage)
+    if prof is not None and _profile_lock.acquire(blocking=False):
+        t0 = perf_counter()
+        prof.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            prof.disable()
+            _profile_lock.release()
+            METRICS.observe(stage, perf_counter() - t0)
+    t0 = perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        METRICS.observe(stage, perf_counter() - t0)
+
+
+def timed(stage):
+    """Decorator: record each call's wall time under stage (when enabled)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            return _run(stage, fn, args, kwargs)
+        return wrapper
+    return deco
+
+
+class _Timer:
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        METRICS.observe(self.stage, perf_counter() - self.t0)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(stage):
+    """Context manager timing a block under stage (a shared no-op while disabled)."""
+    return _Timer(stage) if _enabled else _NULL_TIMER
+
+
+def profile_report(stage, limit=15, sort="cumulative"):
+    """Top functions of a profiled stage, as pstats text ('' if it was never profiled)."""
+    prof = _profilers.get(stage)
+    if prof is None:
+        return ""
+    out = io.StringIO()
+    with _profile_lock:
+        prof.create_stats()
+        if not prof.stats:
+            return ""
+        stats = pstats.Stats(prof, stream=out)
+    stats.sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def streamlit_panel(container=None, expanded=False):
+    """Render the current metrics (and any stage profiles) in a Streamlit expander inside container."""
+    if container is None:
+        import streamlit as container
+    snap = METRICS.snapshot()
+    box = container.expander("🔧 Performance metrics", expanded=expanded)
+    if not snap["stages"] and not snap["counters"]:
+        box.caption("No metrics recorded yet.")
+        return
+    rows = [{"stage": stage, "calls": s["count"], "mean ms": s["sum_s"] / s["count"] * 1e3,
+             "p50 ms": s["p50_s"] * 1e3, "p95 ms": s["p95_s"] * 1e3,
+             "p99 ms": s["p99_s"] * 1e3, "max ms": s["max_s"] * 1e3}
+            for stage, s in snap["stages"].items()]
+    box.dataframe(rows)
+    if snap["counters"]:
+        box.json(snap["counters"])
+    for stage in _profilers:
+        report = profile_report(stage)
+        if report:
+            box.text(f"cProfile: {stage}\n{report}")
+    box.download_button("Download metrics (Prometheus)", METRICS.to_prometheus(), "metrics.prom")
+    box.download_button("Download metrics (JSON)", METRICS.to_json(indent=2), "metrics.json")
@@ -0,0 +1,294 @@
+"""
+Headless load simulator for adaptive sessions.
+
+    python load_simulator.py [--learners 200] [--answers 60] [--workers 4]
+                             [--executor thread|process] [--mode tree|online]
+                             [--mix novice=0.3,average=0.5,expert=0.2] [--json]
+
+- Runs N synthetic learners through the same request path the apps use:
+  check_answer -> PerformanceTracker.log_attempt -> AdaptiveEngineML.update
+  -> PuzzleGenerator.generate for the next puzzle. Only that path is timed,
+  one sample per answer; the learner's "thinking" is simulated, not slept.
+- Learners follow a skill profile: per-difficulty accuracy and a lognormal
+  response time around a per-difficulty mean.
+- Learners are split across worker threads (one shared model registry and
+  retrain worker, as in a single app process) or worker processes (one
+  registry each, each on its own copy of the model file).
+- Reports throughput, p50/p95/p99/max answer latency, the latency of the
+  answers that triggered a retrain (the retrain stalls), background retrain
+  durations, and memory per session (tracemalloc over a separate sample of
+  sessions, so the timed run isn't slowed by tracing).
+- The model starts from a temporary copy of model_adaptive_dt.joblib, so
+  retrains during a run never touch the real model file.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Tuple
+
+import numpy as np
+
+from adaptive_engine_ml import LEVELS, MODEL_PATH, AdaptiveEngineML
+from model_registry import ModelRegistry, load_model, read_manifest, save_model
+from puzzle_generator import PooledPuzzleGenerator, PuzzleGenerator
+from retrain_worker import RetrainWorker
+from tracker import PerformanceTracker
+
+
+@dataclass(frozen=True)
+class Profile:
+    accuracy: Tuple[float, float, float]   # P(correct) on Easy / Medium / Hard
+    mean_time: Tuple[float, float, float]  # mean response time (s) on Easy / Medium / Hard
+    time_sigma: float = 0.35               # lognormal spread of response times
+
+
+PROFILES = {
+    "novice": Profile((0.75, 0.45, 0.20), (9.0, 16.0, 25.0), 0.45),
+    "average": Profile((0.90, 0.70, 0.45), (6.0, 11.0, 18.0)),
+    "expert": Profile((0.97, 0.90, 0.75), (4.0, 7.0, 11.0), 0.25),
+}
+DEFAULT_MIX = {"novice": 0.3, "average": 0.5, "expert": 0.2}
+
+
+class SyntheticLearner:
+    """One simulated session: its own tracker and engine, answering per its profile."""
+
+    def __init__(self, name, profile, rng, generator, engine_kwargs):
+        self.profile = profile
+        self.rng = rng
+        self.generator = generator
+        self.tracker = PerformanceTracker(name)
+        self.engine = AdaptiveEngineML(**engine_kwargs)
+        self.puzzle = generator.generate(self.engine.current_level)
+
+    def answer(self):
+        """Answer the current puzzle. Returns (latency of the request path in s, retrain triggered)."""
+        level = self.engine.current_level
+        i = LEVELS.index(level)
+        p = self.profile
+        correct = self.rng.random() < p.accuracy[i]
+        time_taken = self.rng.lognormvariate(np.log(p.mean_time[i]), p.time_sigma)
+        given = self.puzzle.answer if correct else self.puzzle.answer + 1
+        pending = len(self.engine.new_examples_y)
+
+        t0 = time.perf_counter()
+        ok = self.puzzle.check_answer(given)
+        self.tracker.log_attempt(self.puzzle, ok, time_taken, level)
+        next_level = self.engine.update(ok, time_taken)
+        self.puzzle = self.generator.generate(next_level)
+        latency = time.perf_counter() - t0
+
+        triggered = self.engine.mode == "tree" and len(self.engine.new_examples_y) < pending + 1
+        return latency, triggered
+
+
+def _parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in PROFILES:
+            raise ValueError(f"Unknown profile {name.strip()!r}; choose from: {', '.join(PROFILES)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def _assign_profiles(n, mix, seed):
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+    return rng.choices(names, weights=weights, k=n)
+
+
+def _make_learners(ids, profiles, cfg, generator, registry, worker):
+    engine_kwargs = dict(model_path=cfg["model_path"], retrain_after=cfg["retrain_after"],
+                         registry=registry, background_retrain=cfg["background_retrain"],
+                         retrain_worker=worker, mode=cfg["mode"])
+    return [SyntheticLearner(f"learner{i}", PROFILES[name], random.Random(cfg["seed"] * 1_000_003 + i),
+                             generator, engine_kwargs)
+            for i, name in zip(ids, profiles)]
+
+
+def _generator(cfg, offset=0):
+    if cfg["pooled"]:
+        return PooledPuzzleGenerator(seed=cfg["seed"] + offset)
+    return PuzzleGenerator()
+
+
+def _drive(learners, answers):
+    """Round-robin the learners for `answers` rounds. Returns (latencies, trigger latencies)."""
+    latencies = np.empty(len(learners) * answers)
+    triggers = []
+    k = 0
+    for _ in range(answers):
+        for learner in learners:
+            latency, triggered = learner.answer()
+            latencies[k] = latency
+            k += 1
+            if triggered:
+                triggers.append(latency)
+    return latencies, triggers
+
+
+def _process_worker(ids, profiles, cfg, worker_index):
+    """Process-pool entry point: an independent registry / retrain worker / model file copy."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        model_path = f"{cfg['model_path']}.w{worker_index}"
+        shutil.copyfile(cfg["model_path"], model_path)
+        cfg = dict(cfg, model_path=model_path)
+        registry, worker = ModelRegistry(), RetrainWorker()
+        generator = _generator(cfg, worker_index)
+        learners = _make_learners(ids, profiles, cfg, generator, registry, worker)
+        t0 = time.perf_counter()
+        latencies, triggers = _drive(learners, cfg["answers"])
+        wall = time.perf_counter() - t0
+        worker.wait()
+        if cfg["pooled"]:
+            generator.close()
+    return latencies, triggers, worker.stats(), wall
+
+
+def session_memory(cfg, n=200):
+    """Approximate bytes held per session (tracker + engine + current puzzle) after cfg['answers'] answers."""
+    registry, worker = ModelRegistry(), RetrainWorker()
+    generator = PuzzleGenerator()
+    profiles = _assign_profiles(n, cfg["mix"], cfg["seed"])
+    with contextlib.redirect_stdout(io.StringIO()):
+        # build the shared model (and warm caches) before tracing: they aren't per-session
+        _make_learners([0], profiles[:1], cfg, generator, registry, worker)[0].answer()
+        gc.collect()
+        tracemalloc.start()
+        learners = _make_learners(range(n), profiles, dict(cfg, background_retrain=False), generator, registry, worker)
+        for learner in learners:
+            learner.engine._retrain = lambda X, y: None  # retrained models are shared, not per-session
+            for _ in range(cfg["answers"]):
+                learner.answer()
+        # leave out the simulator's own allocations (e.g. each learner's random.Random state)
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, __file__)])
+        tracemalloc.stop()
+    return sum(stat.size for stat in snapshot.statistics("filename")) / n
+
+
+def run_simulation(learners=200, answers=60, workers=4, executor="thread", mode="tree",
+                   retrain_after=30, background_retrain=True, mix=None, pooled=False,
+                   seed=0, model_path=MODEL_PATH, measure_memory=True):
+    """Run the load test and return a report dict (see format_report)."""
+    if executor not in ("thread", "process"):
+        raise ValueError("executor must be 'thread' or 'process'")
+    mix = mix or DEFAULT_MIX
+    with tempfile.TemporaryDirectory() as tmp:
+        work_path = os.path.join(tmp, os.path.basename(model_path))
+        if read_manifest(model_path) is not None:
+            # the current version, not a stale model_path; workers copy the plain pickle at work_path
+            save_model(load_model(model_path, mmap=False), work_path, legacy_copy=True)
+        elif os.path.exists(model_path):
+            shutil.copyfile(model_path, work_path)
+        else:
+            with contextlib.redirect_stdout(io.StringIO()):
+                AdaptiveEngineML(model_path=work_path, registry=ModelRegistry())
+        cfg = dict(answers=answers, mode=mode, retrain_after=retrain_after,
+                   background_retrain=background_retrain, pooled=pooled, seed=seed,
+                   model_path=work_path, mix=mix)
+
+        profiles = _assign_profiles(learners, mix, seed)
+        workers = max(1, min(workers, learners))
+        slices = [(list(range(w, learners, workers)), profiles[w::workers]) for w in range(workers)]
+
+        if executor == "process":
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_process_worker, *zip(*slices), [cfg] * workers, range(workers)))
+            retrain_stats = [r[2] for r in results]
+            wall = max(r[3] for r in results)  # the processes run side by side
+        else:
+            registry, worker = ModelRegistry(), RetrainWorker()
+            with contextlib.redirect_stdout(io.StringIO()):
+                setup = [(_generator(cfg, w), ids, names) for w, (ids, names) in enumerate(slices)]
+                groups = [(gen, _make_learners(ids, names, cfg, gen, registry, worker)) for gen, ids, names in setup]
+                t0 = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(lambda g: _drive(g[1], answers), groups))
+                wall = time.perf_counter() - t0
+                worker.wait()
+                for gen, _ in groups:
+                    if pooled:
+                        gen.close()
+            retrain_stats = [worker.stats()]
+        memory = session_memory(cfg, n=min(learners, 200)) if measure_memory else None
+
+    latencies = np.concatenate([r[0] for r in results])
+    triggers = np.array([t for r in results for t in r[1]])
+    q = np.percentile(latencies, [50, 95, 99]) if len(latencies) else [0.0] * 3
+    return {
+        "learners": learners,
+        "answers": int(len(latencies)),
+        "workers": workers,
+        "executor": executor,
+        "mode": mode,
+        "wall_s": wall,
+        "throughput_per_s": len(latencies) / wall if wall else 0.0,
+        "latency_ms": {"p50": q[0] * 1e3, "p95": q[1] * 1e3, "p99": q[2] * 1e3,
+                       "max": float(latencies.max()) * 1e3 if len(latencies) else 0.0},
+        "retrain_stalls": {"count": int(len(triggers)),
+                           "p50_ms": float(np.median(triggers)) * 1e3 if len(triggers) else 0.0,
+                           "max_ms": float(triggers.max()) * 1e3 if len(triggers) else 0.0},
+        "retrains": {"completed": sum(s["completed"] for s in retrain_stats),
+                     "coalesced": sum(s["coalesced"] for s in retrain_stats),
+                     "failed": sum(s["failed"] for s in retrain_stats),
+                     "max_duration_ms": max(s["max_duration_s"] for s in retrain_stats) * 1e3},
+        "memory_per_session_bytes": memory,
+    }
+
+
+def format_report(report):
+    lat, stalls, retrains = report["latency_ms"], report["retrain_stalls"], report["retrains"]
+    lines = [
+        f"🧪 {report['learners']} learners, {report['answers']:,} answers, "
+        f"{report['workers']} {report['executor']} worker(s), {report['mode']} mode",
+        f"  throughput      {report['throughput_per_s']:>10,.0f} answers/s ({report['wall_s']:.2f} s)",
+        f"  latency         p50 {lat['p50']:.3f} ms, p95 {lat['p95']:.3f} ms, "
+        f"p99 {lat['p99']:.3f} ms, max {lat['max']:.2f} ms",
+        f"  retrain stalls  {stalls['count']} triggers, p50 {stalls['p50_ms']:.3f} ms, max {stalls['max_ms']:.2f} ms",
+        f"  retrains        {retrains['completed']} completed, {retrains['coalesced']} coalesced, "
+        f"{retrains['failed']} failed, longest {retrains['max_duration_ms']:.1f} ms",
+    ]
+    if report["memory_per_session_bytes"] is not None:
+        lines.append(f"  memory          {report['memory_per_session_bytes'] / 1024:.1f} KiB per session")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test adaptive sessions with synthetic learners")
+    parser.add_argument("--learners", type=int, default=200)
+    parser.add_argument("--answers", type=int, default=60, help="answers per learner")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--mode", choices=["tree", "online"], default="tree")
+    parser.add_argument("--retrain-after", type=int, default=30)
+    parser.add_argument("--inline-retrain", action="store_true", help="retrain on the answering thread")
+    parser.add_argument("--mix", default=None, help="profile weights, e.g. novice=0.3,average=0.5,expert=0.2")
+    parser.add_argument("--pooled", action="store_true", help="use PooledPuzzleGenerator")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the per-session memory probe")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run_simulation(args.learners, args.answers, args.workers, args.executor, args.mode,
+                            args.retrain_after, not args.inline_retrain,
+                            _parse_mix(args.mix) if args.mix else None, args.pooled, args.seed,
+                            measure_memory=not args.no_memory)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Process-wide registry of trained adaptive models.
+
+- Each model file is loaded (or, if it does not exist yet, trained once
+  through the supplied trainer and saved) the first time any engine asks
+  for it. Every later engine gets the very same instance.
+- The shared model is treated as read-only: engines never fit it in place.
+  A retrain builds a new estimator and publishes it, which swaps the
+  registry entry in a single assignment, so readers see either the old or
+  the new model, never a half-updated one.
+- Per-learner state (history, current level, retrain buffer) stays on the
+  engine objects; the registry only holds models.
+
+On disk every saved model is a new version next to model_path:
+
+    model_adaptive_dt.<version>.joblib     the pickled estimator
+    model_adaptive_dt.<version>.tree.npy   flat node array (tree_compiler.FlatTree)
+    model_adaptive_dt.manifest.json        {"current": <version>, ...}
+
+Every file is written to a temp file and moved into place with
+os.replace(), and the manifest is replaced last, so a reader sees either
+the previous version or the new one, never a partial file, and two
+processes saving at once each write their own version. The newest
+KEEP_VERSIONS published versions are kept. model_path itself is left
+alone (it may be under version control) unless save_model is called with
+legacy_copy=True, which also replaces it atomically for older tools.
+
+Loading prefers the flat tree, memory-mapped with np.load(mmap_mode="r"):
+no unpickling (so neither joblib nor sklearn is imported), and worker
+processes share one page-cached copy. A plain
+model_path without a manifest (older checkouts) is loaded with joblib and
+exported as the first version; the file itself is not rewritten.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+from instrumentation import timer
+from tree_compiler import FlatTree
+
+KEEP_VERSIONS = 5
+_SAVE_LOCK = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}    # abs model path -> fitted estimator
+        self._versions = {}  # abs model path -> int, bumped on every publish
+        self._keys = {}      # model path as given -> abs path (get() is on the predict path)
+
+    def _key(self, model_path):
+        key = self._keys.get(model_path)
+        if key is None:
+            key = self._keys[model_path] = os.path.abspath(model_path)
+        return key
+
+    def get(self, model_path, trainer=None, persist=True):
+        """
+        Return the shared model for model_path, loading/training it once.
+
+        With persist=False, model_path is only a registry key: nothing is
+        read from or written to disk and trainer() always builds the model.
+        """
+        key = self._key(model_path)
+        clf = self._models.get(key)
+        if clf is not None:
+            return clf
+        with self._lock:
+            clf = self._models.get(key)
+            if clf is None:
+                manifest = read_manifest(model_path) if persist else None
+                if persist and (manifest is not None or os.path.exists(model_path)):
+                    with timer("registry.load"):
+                        clf = load_model(model_path)
+                    print(f"✅ Loaded model from {model_path}")
+                    if manifest is None:
+                        try:
+                            save_model(clf, model_path)  # export a version + flat tree for next time
+                        except OSError as e:
+                            print("⚠️ Could not write model version:", e)
+                elif trainer is not None:
+                    clf = trainer()
+                    if persist:
+                        save_model(clf, model_path)
+                        print(f"💾 Saved initial model to {model_path}")
+                else:
+                    raise FileNotFoundError(f"No model at {model_path} and no trainer given")
+                self._models[key] = clf
+                self._versions[key] = 1
+        return clf
+
+    def publish(self, model_path, clf, save=True):
+        """Save a newly trained model as the current version and hot-swap it in for every engine."""
+        if save:
+            with timer("registry.save"):
+                save_model(clf, model_path)
+        key = self._key(model_path)
+        with self._lock:
+            self._models[key] = clf
+            self._versions[key] = self._versions.get(key, 0) + 1
+        return self._versions[key]
+
+    def version(self, model_path):
+        """How many times the model for model_path has been loaded/published (0 = never)."""
+        return self._versions.get(self._key(model_path), 0)
+
+    def clear(self):
+        """Forget all cached models (next get() reloads from disk)."""
+        with self._lock:
+            self._models.clear()
+            self._versions.clear()
+
+
+def _atomic_write(path, write, fsync=True):
+    """write(f) into a temp file beside path, fsync it (unless fsync=False), then os.replace it over path."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _version_paths(model_path, version):
+    stem, ext = os.path.splitext(model_path)
+    return f"{stem}.{version}{ext or '.joblib'}", f"{stem}.{version}.tree.npy"
+
+
+def manifest_path(model_path):
+    return f"{os.path.splitext(model_path)[0]}.manifest.json"
+
+
+def read_manifest(model_path):
+    """The manifest for model_path as a dict, or None if there is none (or it is unreadable)."""
+    try:
+        with open(manifest_path(model_path), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_versioned(clf, model_path, version=None):
+    """
+    Save clf next to model_path as <stem>.<version><ext> (version defaults to
+    a UTC timestamp), plus <stem>.<version>.tree.npy for tree models, without
+    touching model_path or the manifest. Returns the new model path.
+    """
+    import joblib
+
+    version = version or datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+    path, tree_path = _version_paths(model_path, version)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _atomic_write(path, lambda f: joblib.dump(clf, f))
+    if hasattr(clf, "tree_") or isinstance(clf, FlatTree):
+        flat = clf if isinstance(clf, FlatTree) else FlatTree.from_estimator(clf)
+        _atomic_write(tree_path, flat.save)
+    return path
+
+
+def save_model(clf, model_path, keep=KEEP_VERSIONS, legacy_copy=False):
+    """
+    Save clf as a new version and make it current: artifacts first, then the
+    manifest (the commit point); legacy_copy=True also replaces model_path
+    with the pickle. Older versions beyond the newest `keep` are deleted.
+    Returns the version string.
+    """
+    with _SAVE_LOCK:
+        version = datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+        path = save_versioned(clf, model_path, version)
+        tree_path = _version_paths(model_path, version)[1]
+        previous = read_manifest(model_path) or {}
+        history = [v for v in previous.get("history", []) if v != version] + [version]
+        manifest = {
+            "current": version,
+            "model": os.path.basename(path),
+            "tree": os.path.basename(tree_path) if os.path.exists(tree_path) else None,
+            "history": history[-keep:],
+        }
+        _atomic_write(manifest_path(model_path), lambda f: f.write(json.dumps(manifest, indent=2).encode("utf-8")))
+        if legacy_copy:
+            import joblib
+            _atomic_write(model_path, lambda f: joblib.dump(clf, f))
+        for old in history[:-keep]:
+            for p in _version_paths(model_path, old):
+                if os.path.exists(p):
+                    os.remove(p)
+    return version
+
+
+def load_model(model_path, mmap=True):
+    """
+    The current model for model_path: the memory-mapped FlatTree of the
+    manifest's current version when it has one (mmap=False reads it into
+    memory), else that version's pickle, else model_path itself.
+    joblib (and with it sklearn) is only imported for the pickles.
+    """
+    folder = os.path.dirname(model_path)
+    for _ in range(2):  # the current version may be pruned between reading the manifest and opening it
+        manifest = read_manifest(model_path)
+        if manifest is None:
+            break
+        try:
+            if manifest.get("tree"):
+                return FlatTree.load(os.path.join(folder, manifest["tree"]), mmap=mmap)
+            import joblib
+            return joblib.load(os.path.join(folder, manifest["model"]))
+        except FileNotFoundError:
+            continue
+    import joblib
+    return joblib.load(model_path)
+
+
+# Default registry shared by every AdaptiveEngineML in the process.
+REGISTRY = ModelRegistry()
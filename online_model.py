@@ -0,0 +1,93 @@
+"""
+Incremental (online) model for the adaptive engine.
+
+The features are small and mostly discrete, so instead of refitting a tree
+this model keeps label counts per feature cell:
+
+    (cur_level, correct_count, avg_time bucket, last_correct) -> counts[label]
+
+- partial_fit_one() adds one (features, label) pair in O(1).
+- predict() picks the most frequent label of the row's cell, backing off to
+  the coarser (cur_level, correct_count, last_correct) cell and then to the
+  current level when a cell has seen too few examples.
+- fit() seeds the tables from a whole batch (e.g. simulated data).
+
+It exposes predict(X) like a sklearn classifier, so AdaptiveEngineML and
+predict_next_levels can use it unchanged (engine mode="online").
+"""
+
+import threading
+
+import numpy as np
+
+N_LEVELS = 3
+
+
+class OnlineCountModel:
+    def __init__(self, window=3, bucket_s=1.0, max_time_s=60.0, min_count=3):
+        self.window = window
+        self.bucket_s = bucket_s
+        self.n_buckets = int(max_time_s / bucket_s) + 1  # last bucket holds everything slower
+        self.min_count = min_count
+        self._lock = threading.Lock()
+        # counts[level, correct_count, time_bucket, last_correct, label]
+        self.fine = np.zeros((N_LEVELS, window + 1, self.n_buckets, 2, N_LEVELS), dtype=np.int64)
+        self.coarse = np.zeros((N_LEVELS, window + 1, 2, N_LEVELS), dtype=np.int64)
+        self.n_seen = 0
+
+    def _cell(self, row):
+        level = min(max(int(row[0]), 0), N_LEVELS - 1)
+        correct = min(max(int(row[1]), 0), self.window)
+        bucket = min(max(int(row[2] / self.bucket_s), 0), self.n_buckets - 1)
+        last = 1 if row[3] else 0
+        return level, correct, bucket, last
+
+    def _cells(self, X):
+        X = np.asarray(X, dtype=np.float64).reshape(-1, 4)
+        level = np.clip(X[:, 0].astype(np.int64), 0, N_LEVELS - 1)
+        correct = np.clip(X[:, 1].astype(np.int64), 0, self.window)
+        bucket = np.clip((X[:, 2] / self.bucket_s).astype(np.int64), 0, self.n_buckets - 1)
+        last = (X[:, 3] != 0).astype(np.int64)
+        return level, correct, bucket, last
+
+    def partial_fit_one(self, features, label):
+        """Add a single example. O(1)."""
+        level, correct, bucket, last = self._cell(features)
+        label = int(label)
+        with self._lock:
+            self.fine[level, correct, bucket, last, label] += 1
+            self.coarse[level, correct, last, label] += 1
+            self.n_seen += 1
+
+    def partial_fit(self, X, y):
+        """Add a batch of examples (sklearn-style name)."""
+        level, correct, bucket, last = self._cells(X)
+        y = np.asarray(y, dtype=np.int64)
+        with self._lock:
+            np.add.at(self.fine, (level, correct, bucket, last, y), 1)
+            np.add.at(self.coarse, (level, correct, last, y), 1)
+            self.n_seen += len(y)
+        return self
+
+    def fit(self, X, y):
+        """Reset the tables and seed them from (X, y)."""
+        with self._lock:
+            self.fine[...] = 0
+            self.coarse[...] = 0
+            self.n_seen = 0
+        return self.partial_fit(X, y)
+
+    def predict(self, X):
+        level, correct, bucket, last = self._cells(X)
+        fine = self.fine[level, correct, bucket, last]
+        coarse = self.coarse[level, correct, last]
+        pred = np.where(fine.sum(axis=1) >= self.min_count, fine.argmax(axis=1),
+                        np.where(coarse.sum(axis=1) >= self.min_count, coarse.argmax(axis=1), level))
+        return pred
+
+
+def train_online_model(window=3, random_state=42, n_samples=2500):
+    """Online model seeded with the same simulated data as the bootstrap tree."""
+    from adaptive_engine_ml import generate_simulated_data
+    X, y = generate_simulated_data(n_samples=n_samples, window=window, seed=random_state)
+    return OnlineCountModel(window=window).fit(X, y)
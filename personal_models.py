@@ -0,0 +1,316 @@
+"""
+Personalized adaptive models, per learner or per cohort.
+
+- The shared model labels attempts with the same avg_time limits for
+  everyone (TIME_THRESHOLDS, 8 / 12 / 18 s). A PersonalModel moves those
+  limits towards one key's own pace: per level, the geometric mean ratio of
+  their correct answer times to the typical time the simulated data (and so
+  the global limits) assume, shrunk towards 1 by PRIOR_WEIGHT pseudo
+  answers and clamped to [1/MAX_PACE, MAX_PACE].
+- Once a key has min_examples attempts, a small decision tree is fitted on
+  its own feature rows plus the simulated rows, all labelled with its
+  personal limits (the simulated rows keep levels the learner hasn't
+  visited sensible), and refitted every refit_every attempts. Until then,
+  engines fall back to the shared model. Trees are kept as
+  tree_compiler.FlatTree, so they compile like the shared one and need no
+  sklearn to load.
+- Keys are arbitrary strings: pass the learner name for per-learner
+  models, or a cohort name shared by several engines for per-cohort ones.
+  A key's model is built for the window of the engine that first uses it
+  (its features and tree depend on it); engines with another window are
+  rejected with ValueError.
+- PersonalModelCache holds the models in least-recently-used order within
+  a byte budget (max_bytes); going over it evicts the least recently used.
+  A model's size is measured (sys.getsizeof over its arrays, its FlatTree
+  and the compiled lookup table built for it), not estimated; a fitted
+  model holds about 25 KB.
+  Persistence is lazy: a model is written to <folder>/<key>.pm only when
+  it is evicted with unsaved changes, or on flush() / close(). A key that
+  is not in memory is loaded from its file (or started fresh), so an
+  evicted learner comes back with one small read and no refit; its tree
+  is compiled on load, not on the learner's next answer.
+- A model file is a fixed header (struct) followed by the raw feature rows
+  and tree nodes, read back with np.frombuffer. Files are replaced
+  atomically but not fsynced: a lost model is refitted from scratch.
+- Fits run on the engine's retrain worker when it has one (coalesced per
+  key), and evicted models are written to disk outside the cache lock, so
+  update() waits for neither. What remains on update() is one feature row
+  copy and the personal tree lookup: benchmarks.py personal_models shows
+  ~2-3x the shared model's p50 (~10 us vs ~4 us) and a p99 of tens of
+  microseconds, from GIL contention with fits running in the background.
+"""
+
+import hashlib
+import os
+import re
+import struct
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from adaptive_engine_ml import TIME_THRESHOLDS, _heuristic_labels, generate_simulated_data
+from model_registry import _atomic_write
+from tree_compiler import NODE_DTYPE, FlatTree, compiled_for
+
+PERSONAL_DIR = os.path.join(".cache", "personal_models")
+REFERENCE_TIMES = np.array([6.0, 10.0, 16.0])  # typical answer time per level in the simulated data
+PRIOR_WEIGHT = 10.0  # pseudo answers at the reference pace
+MAX_PACE = 2.0
+# magic, window, max_rows, rows observed, rows since fit, correct answers per level, log pace sums, tree nodes
+HEADER = struct.Struct("<4sHHQI3d3dI")
+MAGIC = b"PM01"
+
+
+def _deep_sizeof(obj, seen=None):
+    """sys.getsizeof of obj plus everything it holds (containers, arrays, attributes)."""
+    seen = set() if seen is None else seen
+    if obj is None or id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)  # includes the data of arrays that own it
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_sizeof(x, seen) for x in obj)
+    elif isinstance(obj, np.ndarray):
+        size += _deep_sizeof(obj.base, seen)
+    elif hasattr(obj, "__dict__"):
+        size += _deep_sizeof(vars(obj), seen)
+    elif hasattr(obj, "__slots__"):
+        size += sum(_deep_sizeof(getattr(obj, name, None), seen) for name in obj.__slots__)
+    return size
+
+
+class PersonalModel:
+    __slots__ = ("key", "window", "rows", "n_rows", "since_fit", "pace_n", "pace_sum", "tree", "tree_bytes",
+                 "dirty")
+
+    def __init__(self, key, window=3, max_rows=200):
+        self.key = key
+        self.window = window
+        self.rows = np.zeros((max_rows, 4))    # ring buffer of the last max_rows feature rows
+        self.n_rows = 0                        # rows ever observed (next slot is n_rows % max_rows)
+        self.since_fit = 0
+        self.pace_n = np.zeros(3)              # correct answers per level
+        self.pace_sum = np.zeros(3)            # sum of log(time / REFERENCE_TIMES[level]) over them
+        self.tree = None                       # FlatTree once fitted
+        self.tree_bytes = None                 # measured size of tree + its compiled table
+        self.dirty = False
+
+    def set_tree(self, tree):
+        self.tree = tree
+        self.tree_bytes = None
+
+    @property
+    def nbytes(self):
+        """Bytes held for this model, measured; compiles the tree if that hasn't happened yet."""
+        if self.tree is not None and self.tree_bytes is None:
+            self.tree_bytes = _deep_sizeof(self.tree) + _deep_sizeof(compiled_for(self.tree, self.window))
+        return (sys.getsizeof(self) + sys.getsizeof(self.key) + sys.getsizeof(self.rows)
+                + sys.getsizeof(self.pace_n) + sys.getsizeof(self.pace_sum) + (self.tree_bytes or 0))
+
+    def thresholds(self):
+        """Personal avg_time limits for Easy / Medium / Hard."""
+        pace = np.exp(np.clip(self.pace_sum / (self.pace_n + PRIOR_WEIGHT), -np.log(MAX_PACE), np.log(MAX_PACE)))
+        return np.asarray(TIME_THRESHOLDS) * pace
+
+    def observe(self, feat, correct, response_time):
+        """Record one attempt's feature row."""
+        self.rows[self.n_rows % len(self.rows)] = feat
+        self.n_rows += 1
+        self.since_fit += 1
+        if correct:
+            level = int(feat[0])
+            self.pace_n[level] += 1
+            self.pace_sum[level] += np.log(max(response_time, 0.1) / REFERENCE_TIMES[level])
+        self.dirty = True
+
+    def training_rows(self):
+        return self.rows[:min(self.n_rows, len(self.rows))].copy()
+
+    def fit(self, random_state=42):
+        """Fit a new personal tree from the current rows and limits (does not install it)."""
+        from sklearn.tree import DecisionTreeClassifier
+
+        X_sim, _ = generate_simulated_data(n_samples=2000, window=self.window, seed=random_state + 1)
+        X = np.vstack([X_sim, self.training_rows()])
+        y = _heuristic_labels(X[:, 0], X[:, 1], X[:, 2], self.thresholds())
+        clf = DecisionTreeClassifier(max_depth=6, random_state=random_state).fit(X, y)
+        return FlatTree.from_estimator(clf)
+
+    def to_bytes(self):
+        nodes = np.asarray(self.tree.nodes) if self.tree is not None else np.zeros(0, dtype=NODE_DTYPE)
+        header = HEADER.pack(MAGIC, self.window, len(self.rows), self.n_rows, self.since_fit,
+                             *self.pace_n.tolist(), *self.pace_sum.tolist(), len(nodes))
+        return b"".join((header, self.rows.tobytes(), nodes.tobytes()))
+
+    @classmethod
+    def from_bytes(cls, key, data):
+        magic, window, max_rows, n_rows, since_fit, *rest = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not a personal model file")
+        pace_n, pace_sum, n_nodes = rest[:3], rest[3:6], rest[6]
+        model = cls(key, window, max_rows)
+        model.rows = np.frombuffer(data, dtype=np.float64, count=max_rows * 4, offset=HEADER.size).reshape(max_rows, 4).copy()
+        model.n_rows, model.since_fit = n_rows, since_fit
+        model.pace_n[:], model.pace_sum[:] = pace_n, pace_sum
+        if n_nodes:
+            # copied, so the model doesn't keep the whole file's bytes alive
+            model.set_tree(FlatTree(np.frombuffer(data, dtype=NODE_DTYPE, count=n_nodes,
+                                                  offset=HEADER.size + model.rows.nbytes).copy()))
+        return model
+
+
+class PersonalModelCache:
+    def __init__(self, max_bytes=32 << 20, folder=PERSONAL_DIR, window=3, min_examples=30,
+                 refit_every=30, max_rows=200):
+        self.max_bytes = max_bytes
+        self.folder = folder
+        self.window = window  # for keys first used without an engine window
+        self.min_examples = min_examples
+        self.refit_every = refit_every
+        self.max_rows = max_rows
+        self._lock = threading.RLock()
+        self._models = OrderedDict()  # key -> PersonalModel, least recently used first
+        self._sizes = {}              # key -> bytes counted for it
+        self._unwritten = {}          # key -> file bytes of an evicted model, not on disk yet
+        self._io_lock = threading.Lock()  # one writer at a time, in eviction order
+        self.nbytes = 0
+        self.metrics = {"hits": 0, "loaded": 0, "created": 0, "evicted": 0, "saved": 0, "fits": 0}
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, key):
+        return key in self._models
+
+    def path_for(self, key):
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", key)[:40]
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:10]
+        return os.path.join(self.folder, f"{safe}-{digest}.pm")
+
+    def get(self, key, window=None):
+        """
+        key's model, from memory, else from disk, else a new one for window
+        (default self.window); marks it most recently used. Raises ValueError
+        if key's model was built for a different window.
+        """
+        model = self._get(key, window)
+        self._write_evicted()
+        return model
+
+    def _get(self, key, window=None):
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.metrics["hits"] += 1
+            else:
+                model = self._load(key)
+                if model is None:
+                    model = PersonalModel(key, window or self.window, self.max_rows)
+                    self.metrics["created"] += 1
+                else:
+                    self.metrics["loaded"] += 1
+                self._models[key] = model
+                self._resize(key)
+        if window is not None and model.window != window:
+            raise ValueError(f"Personal model {key!r} was built for window {model.window}, not {window}")
+        return model
+
+    def tree_for(self, key, window=None):
+        """key's fitted tree, or None while the engine should use the shared model."""
+        return self.get(key, window).tree
+
+    def thresholds(self, key, window=None):
+        return self.get(key, window).thresholds()
+
+    def observe(self, key, feat, correct, response_time, worker=None, window=None):
+        """Feed one attempt; schedules a refit on worker (or runs it inline) when due."""
+        with self._lock:
+            model = self._get(key, window)
+            model.observe(feat, correct, response_time)
+            due = model.n_rows >= self.min_examples and (model.tree is None or model.since_fit >= self.refit_every)
+        self._write_evicted()
+        if not due:
+            return
+        if worker is not None:
+            worker.submit(("personal", id(self), key), [], [], lambda X, y: self.refit(key, window))
+        else:
+            self.refit(key, window)
+
+    def refit(self, key, window=None):
+        with self._lock:
+            model = self._get(key, window)
+            model.since_fit = 0
+        tree = model.fit()
+        compiled_for(tree, model.window)  # compile here, not on the learner's next predict
+        with self._lock:
+            model = self._get(key, window)  # may have been evicted and reloaded meanwhile
+            model.set_tree(tree)
+            model.dirty = True
+            self.metrics["fits"] += 1
+            self._resize(key)
+        self._write_evicted()
+        return tree
+
+    def _resize(self, key):
+        size = self._models[key].nbytes
+        self.nbytes += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+        while self.nbytes > self.max_bytes and len(self._models) > 1:
+            old_key, old = self._models.popitem(last=False)
+            self.nbytes -= self._sizes.pop(old_key)
+            self.metrics["evicted"] += 1
+            if old.dirty:
+                self._unwritten[old_key] = old.to_bytes()  # written by _write_evicted, outside the lock
+                old.dirty = False
+
+    def _load(self, key):
+        data = self._unwritten.get(key)
+        if data is not None:  # evicted, and its write hasn't happened yet
+            return PersonalModel.from_bytes(key, data)
+        path = self.path_for(key)
+        try:
+            with open(path, "rb") as f:
+                return PersonalModel.from_bytes(key, f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error) as e:
+            print(f"⚠️ Ignoring unreadable personal model {path}:", e)
+            return None
+
+    def _write_evicted(self):
+        """Write pending model files, without holding the cache lock (callers must not hold it either)."""
+        if not self._unwritten:
+            return
+        with self._io_lock:
+            while True:
+                with self._lock:
+                    if not self._unwritten:
+                        return
+                    key, data = next(iter(self._unwritten.items()))
+                os.makedirs(self.folder, exist_ok=True)
+                _atomic_write(self.path_for(key), lambda f: f.write(data), fsync=False)
+                with self._lock:
+                    if self._unwritten.get(key) is data:  # not superseded by a newer eviction meanwhile
+                        del self._unwritten[key]
+                    self.metrics["saved"] += 1
+
+    def flush(self):
+        """Write every model with unsaved changes to disk."""
+        with self._lock:
+            for key, model in self._models.items():
+                if model.dirty:
+                    self._unwritten[key] = model.to_bytes()
+                    model.dirty = False
+        self._write_evicted()
+
+    def close(self):
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.metrics, models=len(self._models), nbytes=self.nbytes, max_bytes=self.max_bytes)
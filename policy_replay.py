@@ -0,0 +1,341 @@
+"""
+Replay logged attempt sequences through several difficulty policies at once.
+
+    python policy_replay.py [logs_dir] [--policies rule,summary,heuristic,ml] [--window 3]
+                            [--model-path PATH] [--out trajectories.csv]
+
+- Attempts come from the session CSVs (PerformanceTracker.save_csv / csv
+  sink), or from arrays via Attempts(...). A session is one learner in one
+  log file; every policy starts a session at the level it was logged at.
+- Policies:
+    logged     what actually happened (the difficulty column)
+    rule       main.AdaptiveEngine: up after a correct answer under 10 s,
+               down after a wrong one
+    summary    ProgressSummary._recommend_next_level over the last 3 attempts
+    heuristic  _heuristic_label, the rule the ML engine's labels come from
+    ml         AdaptiveEngineML with the current model (fixed for the
+               replay: the engine's in-session retrains are not replayed)
+- The learner's answers are taken as logged, whatever level a policy would
+  have served: a policy's level trajectory is where it would have moved
+  this learner given the same correct / time sequence.
+- Nothing loops over attempts in Python. Features are rolling-window sums
+  over the whole attempt arrays; each policy turns them into a transition
+  table (next level for each of the 3 possible current levels, per
+  attempt), and trajectories are the running composition of those tables,
+  computed with a segmented log-step prefix scan (log2 of the longest
+  session steps). A table is one of 27 maps {0,1,2} -> {0,1,2}, so each
+  composition is a single lookup in a 27 x 27 table.
+- The ml policy scores through the engine's compiled lookup table
+  (tree_compiler), one searchsorted per feature cell, so it makes the
+  same decisions as AdaptiveEngineML.update except where an avg_time sits
+  within float rounding of a split threshold (the engine keeps running
+  sums, the replay takes differences of cumulative sums).
+- Reported per policy: level mix and move rates; per pair of policies:
+  trajectory agreement (same level served) and decision agreement (same
+  next level from the logged state, i.e. one step from where the learner
+  really was).
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from adaptive_engine_ml import LEVELS, MODEL_PATH, _heuristic_labels, train_initial_model
+from cohort_analytics import _as_bool, read_chunks
+from model_registry import REGISTRY
+from replay_training import CHUNK_ROWS, session_files
+from tree_compiler import compiled_for
+
+N_LEVELS = len(LEVELS)
+RECENT = 3  # attempts ProgressSummary looks back over
+
+# a transition table row is encoded as t[0] * 9 + t[1] * 3 + t[2]; COMPOSE[g, f] encodes s -> g[f[s]]
+_MAPS = np.array([[c // 9, c // 3 % 3, c % 3] for c in range(27)])
+COMPOSE = np.array([[int(np.dot(g[f], (9, 3, 1))) for f in _MAPS] for g in _MAPS], dtype=np.uint8)
+
+
+class Attempts:
+    """Logged attempts as flat arrays, grouped into contiguous sessions in attempt order."""
+
+    def __init__(self, session, level, correct, time_taken, users=None):
+        """
+        session: one integer code per attempt (attempts of a session in order;
+        sessions may interleave). level: served level 0-2. users: optional
+        name per session code.
+        """
+        session = np.asarray(session, dtype=np.int64)
+        order = np.argsort(session, kind="stable")
+        self.session = session[order]
+        self.level = np.asarray(level, dtype=np.int8)[order]
+        self.correct = np.asarray(correct, dtype=bool)[order]
+        self.time = np.asarray(time_taken, dtype=np.float64)[order]
+        self.users = users
+        n = len(self.session)
+        self.first = np.ones(n, dtype=bool)
+        self.first[1:] = self.session[1:] != self.session[:-1]
+        self.last = np.ones(n, dtype=bool)
+        self.last[:-1] = self.first[1:]
+        starts = np.flatnonzero(self.first)
+        self.start = np.repeat(starts, np.diff(np.append(starts, n)))  # index of each row's session start
+        self.pos = np.arange(n) - self.start                           # attempt number within the session
+        self._rolling = {}
+
+    def __len__(self):
+        return len(self.session)
+
+    @property
+    def n_sessions(self):
+        return int(self.first.sum())
+
+    @property
+    def max_session_len(self):
+        return int(self.pos.max()) + 1 if len(self) else 0
+
+    def rolling(self, window):
+        """(correct count, mean time, attempts) over the last `window` attempts of each row's session."""
+        cached = self._rolling.get(window)
+        if cached is not None:
+            return cached
+        count = np.zeros(len(self), dtype=np.int64)
+        total = np.zeros(len(self), dtype=np.float64)
+        n = np.zeros(len(self), dtype=np.int64)
+        # oldest first, like sum() over the engine's history deque
+        for lag in range(window - 1, -1, -1):
+            rows = np.flatnonzero(self.pos >= lag)
+            count[rows] += self.correct[rows - lag]
+            total[rows] += self.time[rows - lag]
+            n[rows] += 1
+        cached = self._rolling[window] = (count, total / np.maximum(n, 1), n)
+        return cached
+
+
+def load_attempts(folder="logs", chunk_rows=CHUNK_ROWS):
+    """Every attempt in folder's session CSVs; a session is one user in one file."""
+    cols = ("user", "difficulty", "correct", "time_taken")
+    files, users, levels, correct, times = [], [], [], [], []
+    for i, path in enumerate(session_files(folder)):
+        for chunk in read_chunks(path, cols, chunk_rows):
+            level = pd.Categorical(chunk["difficulty"], categories=LEVELS).codes
+            known = level >= 0  # skip rows with an unknown difficulty name
+            files.append(np.full(int(known.sum()), i, dtype=np.int64))
+            users.append(chunk["user"].astype(str).to_numpy()[known])
+            levels.append(level[known])
+            correct.append(_as_bool(chunk["correct"])[known])
+            times.append(pd.to_numeric(chunk["time_taken"], errors="coerce").fillna(0.0).to_numpy()[known])
+    if not files:
+        return Attempts([], [], [], [])
+    user_codes, names = pd.factorize(np.concatenate(users))
+    session_codes, pairs = pd.factorize(np.concatenate(files) * len(names) + user_codes)
+    return Attempts(session_codes, np.concatenate(levels), np.concatenate(correct), np.concatenate(times),
+                    users=names[pairs % len(names)])
+
+
+# --- policies: attempts -> (n, 3) table of the next level from each current level ---
+
+def _step(state, up, down):
+    return np.where(up, np.minimum(state + 1, N_LEVELS - 1), np.where(down, np.maximum(state - 1, 0), state))
+
+
+def rule_policy(attempts, window=3):
+    """main.AdaptiveEngine.update."""
+    state = np.arange(N_LEVELS)[None, :]
+    up = (attempts.correct & (attempts.time < 10))[:, None]
+    down = ~attempts.correct[:, None]
+    return _step(state, up, down)
+
+
+def summary_policy(attempts, window=3):
+    """ProgressSummary._recommend_next_level from the level the last attempt was served at."""
+    count, avg_time, n = attempts.rolling(RECENT)
+    acc = count / n
+    state = np.arange(N_LEVELS)[None, :]
+    up = ((acc >= 0.66) & (avg_time < 12))[:, None]
+    down = ((acc <= 0.33) | (avg_time > 18))[:, None]
+    return _step(state, up, down)
+
+
+def heuristic_policy(attempts, window=3):
+    """_heuristic_label on the engine's rolling-window features."""
+    count, avg_time, _ = attempts.rolling(window)
+    return np.column_stack([_heuristic_labels(np.full(len(attempts), s), count, avg_time)
+                            for s in range(N_LEVELS)])
+
+
+class MLPolicy:
+    """AdaptiveEngineML.update with a fixed model: one step towards the model's prediction."""
+
+    def __init__(self, model_path=MODEL_PATH, clf=None):
+        self.clf = clf if clf is not None else REGISTRY.get(model_path, train_initial_model)
+
+    def __call__(self, attempts, window=3):
+        pred = self._predict(attempts, window)
+        state = np.arange(N_LEVELS)[None, :]
+        return _step(state, pred > state, pred < state)
+
+    def _predict(self, attempts, window):
+        """(n, 3) model prediction for each attempt's features with cur_level 0, 1 and 2."""
+        count, avg_time, _ = attempts.rolling(window)
+        last_correct = attempts.correct.astype(np.int64)
+        compiled = compiled_for(self.clf, window)
+        if compiled is None:
+            rows = np.concatenate([np.column_stack([np.full(len(attempts), s), count, avg_time, last_correct])
+                                   for s in range(N_LEVELS)]).astype(np.float64)
+            return np.asarray(self.clf.predict(rows), dtype=np.int64).reshape(N_LEVELS, -1).T
+        # the same lookup as CompiledTree.predict_one, vectorized per (correct_count, last_correct) cell
+        pred = np.empty((len(attempts), N_LEVELS), dtype=np.int64)
+        cell = count * 2 + last_correct
+        for k in np.unique(cell).tolist():
+            rows = np.flatnonzero(cell == k)
+            t = avg_time[rows]
+            for s in range(N_LEVELS):
+                entry = compiled.table.get((s, k // 2, k % 2))
+                if entry is None:  # outside the compiled grid: walk the tree like predict_one does
+                    pred[rows, s] = compiled.predict(np.column_stack([np.full(len(rows), s), count[rows], t,
+                                                                      last_correct[rows]]))
+                    continue
+                thresholds, labels = entry
+                pred[rows, s] = np.asarray(labels)[np.searchsorted(thresholds, t, side="left")]
+        return pred
+
+
+POLICIES = {
+    "rule": rule_policy,
+    "summary": summary_policy,
+    "heuristic": heuristic_policy,
+    "ml": MLPolicy,
+}
+
+
+def _compose(attempts, table):
+    """
+    Running composition of the per-attempt tables within each session, as
+    codes: level after attempts start..t from start level s is
+    _MAPS[out[t], s]. Segmented Hillis-Steele scan, log2(longest session)
+    vectorized steps.
+    """
+    prefix = (table @ np.array([9, 3, 1])).astype(np.uint8)
+    shift = 1
+    while shift < attempts.max_session_len:
+        rows = np.flatnonzero(attempts.pos >= shift)
+        # apply the earlier prefix first, then this row's
+        prefix[rows] = COMPOSE[prefix[rows], prefix[rows - shift]]
+        shift *= 2
+    return prefix
+
+
+class ReplayResult:
+    def __init__(self, attempts, levels, decisions):
+        self.attempts = attempts
+        self.levels = levels        # policy -> level each attempt would have been served at
+        self.decisions = decisions  # policy -> next level from the logged level (-1 after a session's last attempt for "logged")
+
+    def summary(self):
+        """Per policy: share of attempts served at each level, mean level and up/down move rates."""
+        rows = []
+        same_session = ~self.attempts.last
+        for name, lv in self.levels.items():
+            share = np.bincount(lv, minlength=N_LEVELS) / max(len(lv), 1)
+            moves = np.diff(lv.astype(np.int64))[same_session[:-1]] if len(lv) > 1 else np.zeros(0)
+            rows.append({
+                "policy": name,
+                **{f"{LEVELS[i].lower()}_share": share[i] for i in range(N_LEVELS)},
+                "mean_level": float(lv.mean()) if len(lv) else float("nan"),
+                "up_rate": float((moves > 0).mean()) if len(moves) else 0.0,
+                "down_rate": float((moves < 0).mean()) if len(moves) else 0.0,
+            })
+        return pd.DataFrame(rows)
+
+    def agreement(self, kind="trajectory"):
+        """Policy x policy share of attempts with the same served level ("trajectory") or next level ("decision")."""
+        values = self.levels if kind == "trajectory" else self.decisions
+        names = list(values)
+        valid = self.decisions["logged"] >= 0 if kind == "decision" and "logged" in values else slice(None)
+        out = np.ones((len(names), len(names)))
+        for i, a in enumerate(names):
+            for j in range(i + 1, len(names)):
+                out[i, j] = out[j, i] = float((values[a][valid] == values[names[j]][valid]).mean())
+        return pd.DataFrame(out, index=names, columns=names)
+
+    def trajectories(self):
+        """Per-attempt frame: session, user, attempt number, correct, time and each policy's level name."""
+        a = self.attempts
+        df = pd.DataFrame({"session": a.session, "attempt": a.pos + 1, "correct": a.correct, "time_taken": a.time})
+        if a.users is not None:
+            df.insert(1, "user", np.asarray(a.users)[a.session])
+        names = np.array(LEVELS)
+        for name, lv in self.levels.items():
+            df[name] = names[lv]
+        return df
+
+
+def replay(attempts, policies=("rule", "summary", "heuristic", "ml"), window=3, model_path=MODEL_PATH):
+    """
+    Replay attempts through each named policy (or a callable returning a
+    transition table). Always includes "logged". Returns a ReplayResult.
+    """
+    rows = np.arange(len(attempts))
+    logged_next = np.full(len(attempts), -1, dtype=np.int8)
+    logged_next[:-1][~attempts.last[:-1]] = attempts.level[1:][~attempts.last[:-1]]
+    levels, decisions = {"logged": attempts.level}, {"logged": logged_next}
+    start_level = attempts.level[attempts.start]
+    for name in policies:
+        policy = POLICIES[name] if isinstance(name, str) else name
+        if policy is MLPolicy:
+            policy = MLPolicy(model_path)
+        table = policy(attempts, window)
+        name = name if isinstance(name, str) else getattr(name, "__name__", repr(name))
+        decisions[name] = table[rows, attempts.level].astype(np.int8)
+        after = _MAPS[_compose(attempts, table), start_level]
+        served = np.empty(len(attempts), dtype=np.int8)
+        served[attempts.first] = start_level[attempts.first]
+        served[1:][~attempts.first[1:]] = after[:-1][~attempts.first[1:]]
+        levels[name] = served
+    return ReplayResult(attempts, levels, decisions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay session logs through several difficulty policies")
+    parser.add_argument("folder", nargs="?", default="logs")
+    parser.add_argument("--policies", default="rule,summary,heuristic,ml",
+                        help=f"comma-separated, from: {', '.join(POLICIES)}")
+    parser.add_argument("--window", type=int, default=3)
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--out", default=None, help="also write per-attempt trajectories to this CSV")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.folder):
+        print(f"❌ No such folder: {args.folder}")
+        return 1
+    policies = [p for p in args.policies.split(",") if p]
+    unknown = [p for p in policies if p not in POLICIES]
+    if unknown:
+        print(f"❌ Unknown policies: {', '.join(unknown)}")
+        return 1
+    attempts = load_attempts(args.folder)
+    if not len(attempts):
+        print(f"❌ No attempts found in {args.folder}")
+        return 1
+    t0 = time.perf_counter()
+    result = replay(attempts, policies, args.window, args.model_path)
+    elapsed = time.perf_counter() - t0
+    print(f"🔁 Replayed {len(attempts):,} attempts in {attempts.n_sessions:,} sessions "
+          f"through {len(policies)} policies in {elapsed:.2f}s")
+    fmt = '{:,.3f}'.format
+    print("\nLevels by policy:")
+    print(result.summary().to_string(index=False, float_format=fmt))
+    print("\nTrajectory agreement (same level served):")
+    print(result.agreement("trajectory").to_string(float_format=fmt))
+    print("\nDecision agreement (same next level from the logged level):")
+    print(result.agreement("decision").to_string(float_format=fmt))
+    if args.out:
+        result.trajectories().to_csv(args.out, index=False)
+        print(f"\n💾 Trajectories written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
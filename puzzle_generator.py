@@ -1,102 +1,253 @@
-import random
-from dataclasses import dataclass
-from typing import Callable, Tuple
-
-@dataclass
-class Puzzle:
-    prompt: str
-    answer: float
-    meta: dict
-
-    def check_answer(self, user_answer):
-        if user_answer is None:
-            return False
-        try:
-            return abs(float(user_answer) - float(self.answer)) < 1e-6
-        except:
-            return False
-
-
-class PuzzleGenerator:
-    def __init__(self):
-        pass
-
-    def generate(self, difficulty: str) -> Puzzle:
-        if difficulty == "Easy":
-            return self._easy()
-        elif difficulty == "Medium":
-            return self._medium()
-        elif difficulty == "Hard":
-            return self._hard()
-        else:
-            raise ValueError("Invalid difficulty level!")
-
-    def _easy(self) -> Puzzle:
-        a = random.randint(1, 9)
-        b = random.randint(1, 9)
-        op = random.choice(['+', '-'])
-        prompt = f"{a} {op} {b} = ?"
-        answer = a + b if op == "+" else a - b
-        return Puzzle(prompt, answer, {"a": a, "b": b, "op": op})
-
-    def _medium(self) -> Puzzle:
-        choice = random.random()
-        if choice < 0.5:
-            a = random.randint(10, 99)
-            b = random.randint(1, 99)
-            op = random.choice(["+", "-"])
-            prompt = f"{a} {op} {b} = ?"
-            answer = a + b if op == "+" else a - b
-        else:
-            a = random.randint(2, 9)
-            b = random.randint(2, 9)
-            prompt = f"{a} * {b} = ?"
-            answer = a * b
-        return Puzzle(prompt, answer, {"op": "mix", "choice": choice})
-
-    def _hard(self) -> Puzzle:
-        choice = random.random()
-        if choice < 0.6:
-            a = random.randint(10, 99)
-            b = random.randint(2, 20)
-            prompt = f"{a} * {b} = ?"
-            answer = a * b
-        else:
-            b = random.randint(2, 12)
-            q = random.randint(2, 12)
-            a = b * q
-            prompt = f"{a} / {b} = ?"
-            answer = q
-        return Puzzle(prompt, answer, {"op": "hard", "choice": choice})
-
-
-# ✅ Interactive loop
-if __name__ == "__main__":
-    gen = PuzzleGenerator()
-    print("🎮 Welcome to the Puzzle Game!")
-    print("Type 'exit' anytime to quit.\n")
-
-    while True:
-        level = input("Choose difficulty (Easy / Medium / Hard): ").capitalize()
-        if level.lower() == "exit":
-            print("👋 Thanks for playing!")
-            break
-
-        try:
-            puzzle = gen.generate(level)
-        except ValueError:
-            print("❌ Invalid choice! Please enter Easy, Medium, or Hard.\n")
-            continue
-
-        print("\nSolve this puzzle:")
-        print(puzzle.prompt)
-        user_input = input("Your answer (or type 'exit' to quit): ")
-
-        if user_input.lower() == "exit":
-            print("👋 Thanks for playing!")
-            break
-
-        if puzzle.check_answer(user_input):
-            print("✅ Correct!\n")
-        else:
-            print(f"❌ Wrong! The correct answer was: {puzzle.answer}\n")
+import random
+import re
+import threading
+from collections import deque
+from typing import Tuple
+
+import numpy as np
+
+from instrumentation import timed
+
+LEVELS = ["Easy", "Medium", "Hard"]
+OPS = ("+", "-", "*", "/")
+ADD, SUB, MUL, DIV = range(4)
+_INT_ANSWER = re.compile(r"\s*([+-]?\d+)(?:\.0*)?\s*")
+
+
+class Puzzle:
+    """
+    One "a <op> b = ?" puzzle, kept as three small ints: the operands and
+    an op code (index into OPS). The answer follows from them and the
+    prompt string is only rendered (and cached) when something reads it.
+    """
+
+    __slots__ = ("a", "b", "op", "_prompt")
+
+    def __init__(self, a: int, b: int, op: int):
+        self.a = a
+        self.b = b
+        self.op = op
+        self._prompt = None
+
+    @property
+    def prompt(self) -> str:
+        if self._prompt is None:
+            self._prompt = f"{self.a} {OPS[self.op]} {self.b} = ?"
+        return self._prompt
+
+    @property
+    def answer(self) -> int:
+        a, b, op = self.a, self.b, self.op
+        if op == ADD:
+            return a + b
+        if op == SUB:
+            return a - b
+        if op == MUL:
+            return a * b
+        return a // b  # division puzzles are generated with an exact quotient
+
+    @property
+    def key(self) -> Tuple[int, int, int]:
+        return (self.a, self.b, self.op)
+
+    @property
+    def meta(self) -> dict:
+        return {"a": self.a, "b": self.b, "op": OPS[self.op]}
+
+    def __eq__(self, other):
+        return isinstance(other, Puzzle) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"Puzzle({self.prompt!r}, answer={self.answer})"
+
+    def check_answer(self, user_answer):
+        """Exact integer check; accepts ints, integral floats and strings like "12", " -3 " or "12.0"."""
+        if isinstance(user_answer, str):
+            m = _INT_ANSWER.fullmatch(user_answer)
+            if m is None:
+                return False
+            user_answer = int(m.group(1))
+        elif isinstance(user_answer, bool) or not isinstance(user_answer, (int, float, np.integer, np.floating)):
+            return False
+        return user_answer == self.answer
+
+
+class PuzzleGenerator:
+    def __init__(self):
+        pass
+
+    @timed("puzzle.generate")
+    def generate(self, difficulty: str) -> Puzzle:
+        if difficulty == "Easy":
+            return self._easy()
+        elif difficulty == "Medium":
+            return self._medium()
+        elif difficulty == "Hard":
+            return self._hard()
+        else:
+            raise ValueError("Invalid difficulty level!")
+
+    def _easy(self) -> Puzzle:
+        a = random.randint(1, 9)
+        b = random.randint(1, 9)
+        op = random.choice((ADD, SUB))
+        return Puzzle(a, b, op)
+
+    def _medium(self) -> Puzzle:
+        choice = random.random()
+        if choice < 0.5:
+            a = random.randint(10, 99)
+            b = random.randint(1, 99)
+            op = random.choice((ADD, SUB))
+        else:
+            a = random.randint(2, 9)
+            b = random.randint(2, 9)
+            op = MUL
+        return Puzzle(a, b, op)
+
+    def _hard(self) -> Puzzle:
+        choice = random.random()
+        if choice < 0.6:
+            a = random.randint(10, 99)
+            b = random.randint(2, 20)
+            op = MUL
+        else:
+            b = random.randint(2, 12)
+            q = random.randint(2, 12)
+            a = b * q
+            op = DIV
+        return Puzzle(a, b, op)
+
+
+class PooledPuzzleGenerator(PuzzleGenerator):
+    """
+    PuzzleGenerator that serves puzzles from pre-generated pools.
+
+    - Each difficulty has a FIFO pool of ready Puzzle objects; generate()
+      just pops one (O(1)).
+    - Pools are filled in batches drawn with NumPy (operand and op-code
+      arrays) using the same distributions as _easy / _medium / _hard, and
+      refilled by a background thread once they drop below
+      low_water * pool_size (or inline if a pool runs dry).
+    - Every difficulty has its own seeded Generator and batches are drawn
+      under a lock, so a given seed always yields the same puzzle sequence
+      per difficulty, whatever the refill timing.
+    """
+
+    def __init__(self, pool_size=2048, low_water=0.25, seed=None, background=True):
+        super().__init__()
+        self.pool_size = pool_size
+        self.low_water = max(1, int(pool_size * low_water))
+        children = np.random.SeedSequence(seed).spawn(len(LEVELS))
+        self._rngs = {level: np.random.default_rng(c) for level, c in zip(LEVELS, children)}
+        self._pools = {level: deque() for level in LEVELS}
+        self._locks = {level: threading.Lock() for level in LEVELS}
+        self._wake = threading.Event()
+        self._closed = False
+        for level in LEVELS:
+            self._refill(level)
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._refill_loop, name="puzzle-pool", daemon=True)
+            self._thread.start()
+
+    @timed("puzzle.generate")
+    def generate(self, difficulty: str) -> Puzzle:
+        pool = self._pools.get(difficulty)
+        if pool is None:
+            raise ValueError("Invalid difficulty level!")
+        if len(pool) <= self.low_water:
+            if self._thread is not None:
+                self._wake.set()
+            else:
+                self._refill(difficulty)
+        try:
+            return pool.popleft()
+        except IndexError:  # drained faster than the background refill
+            self._refill(difficulty)
+            return pool.popleft()
+
+    def close(self):
+        """Stop the background refill thread."""
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _refill_loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._closed:
+                return
+            for level in LEVELS:
+                if len(self._pools[level]) <= self.low_water:
+                    self._refill(level)
+
+    @timed("puzzle.refill")
+    def _refill(self, level):
+        with self._locks[level]:
+            if len(self._pools[level]) > self.low_water:
+                return  # someone else refilled while we waited
+            batch = getattr(self, f"_batch_{level.lower()}")(self._rngs[level], self.pool_size)
+            self._pools[level].extend(batch)
+
+    @staticmethod
+    def _batch_easy(rng, n):
+        a = rng.integers(1, 10, n)
+        b = rng.integers(1, 10, n)
+        op = np.where(rng.random(n) < 0.5, ADD, SUB)
+        return list(map(Puzzle, a.tolist(), b.tolist(), op.tolist()))
+
+    @staticmethod
+    def _batch_medium(rng, n):
+        add_sub = rng.random(n) < 0.5
+        a = np.where(add_sub, rng.integers(10, 100, n), rng.integers(2, 10, n))
+        b = np.where(add_sub, rng.integers(1, 100, n), rng.integers(2, 10, n))
+        op = np.where(add_sub, np.where(rng.random(n) < 0.5, ADD, SUB), MUL)
+        return list(map(Puzzle, a.tolist(), b.tolist(), op.tolist()))
+
+    @staticmethod
+    def _batch_hard(rng, n):
+        mult = rng.random(n) < 0.6
+        m_a, m_b = rng.integers(10, 100, n), rng.integers(2, 21, n)
+        d_b, d_q = rng.integers(2, 13, n), rng.integers(2, 13, n)
+        a = np.where(mult, m_a, d_b * d_q)
+        b = np.where(mult, m_b, d_b)
+        op = np.where(mult, MUL, DIV)
+        return list(map(Puzzle, a.tolist(), b.tolist(), op.tolist()))
+
+# ✅ Interactive loop
+if __name__ == "__main__":
+    gen = PuzzleGenerator()
+    print("🎮 Welcome to the Puzzle Game!")
+    print("Type 'exit' anytime to quit.\n")
+
+    while True:
+        level = input("Choose difficulty (Easy / Medium / Hard): ").capitalize()
+        if level.lower() == "exit":
+            print("👋 Thanks for playing!")
+            break
+
+        try:
+            puzzle = gen.generate(level)
+        except ValueError:
+            print("❌ Invalid choice! Please enter Easy, Medium, or Hard.\n")
+            continue
+
+        print("\nSolve this puzzle:")
+        print(puzzle.prompt)
+        user_input = input("Your answer (or type 'exit' to quit): ")
+
+        if user_input.lower() == "exit":
+            print("👋 Thanks for playing!")
+            break
+
+        if puzzle.check_answer(user_input):
+            print("✅ Correct!\n")
+        else:
+            print(f"❌ Wrong! The correct answer was: {puzzle.answer}\n")
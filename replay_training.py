@@ -0,0 +1,194 @@
+"""
+Retrain the adaptive model on real attempt histories from saved session logs.
+
+    python replay_training.py [logs_dir] [--window 3] [--max-samples 500000] [--publish]
+
+- Session CSVs (PerformanceTracker.save_csv / csv sink) are streamed in
+  chronological order (by the timestamp in the file name), chunk by chunk.
+- For each learner the engine's rolling-window features
+  [cur_level, correct_count, avg_time, last_correct] are rebuilt in attempt
+  order with vectorized window sums; only the last `window` attempts per
+  learner are carried between chunks. cur_level is the difficulty the
+  attempt was served at, i.e. the engine's current level at update time.
+- Labels are the same _heuristic_label the engine uses for its own retrain
+  buffer.
+- Memory stays bounded: rows go into a fixed-size uniform reservoir sample
+  (max_samples), however many millions of attempts the logs hold.
+- The decision tree is trained on the reservoir (plus the usual simulated
+  rows, so unseen feature regions keep sensible defaults) and written as a
+  new model version next to the current one; with --publish it becomes the
+  current version in the manifest (and is hot-swapped in this process).
+"""
+
+import argparse
+import glob
+import os
+import re
+import sys
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from adaptive_engine_ml import LEVELS, MODEL_PATH, _heuristic_labels, generate_simulated_data
+from cohort_analytics import _as_bool, read_chunks
+from model_registry import REGISTRY, read_manifest, save_versioned
+
+CHUNK_ROWS = 100_000
+_STAMP = re.compile(r"(\d{8}T\d{6})(\d{6})?Z\.csv$")  # save_csv names; microseconds since they became unique
+
+
+def session_files(folder):
+    """Session CSVs in folder, oldest first (by the timestamp save_csv puts in the name)."""
+    paths = glob.glob(os.path.join(folder, "*.csv"))
+
+    def key(path):
+        m = _STAMP.search(os.path.basename(path))
+        return (m.group(1) + (m.group(2) or "000000") if m else "", os.path.basename(path))
+    return sorted(paths, key=key)
+
+
+def rolling_features(cur_level, correct, times, carry, window):
+    """
+    Engine features for one learner's consecutive attempts.
+    carry is a deque(maxlen=window) of (correct, time) from earlier attempts;
+    it is updated in place. Returns X (n x 4 float64).
+    These are the features AdaptiveEngineML._feature_row gives up to float
+    rounding: the engine keeps running sums (re-summed every 1024 pushes),
+    this takes differences of cumulative sums, so avg_time can differ in
+    the last bits.
+    """
+    m = len(carry)
+    c = np.concatenate([np.array([a for a, _ in carry], dtype=np.float64), correct.astype(np.float64)])
+    t = np.concatenate([np.array([b for _, b in carry], dtype=np.float64), times.astype(np.float64)])
+    cs_c = np.concatenate([[0.0], np.cumsum(c)])
+    cs_t = np.concatenate([[0.0], np.cumsum(t)])
+    k = np.arange(m, len(c))
+    lo = np.maximum(0, k - window + 1)
+    count = k + 1 - lo
+    X = np.column_stack([
+        cur_level,
+        np.rint(cs_c[k + 1] - cs_c[lo]),
+        (cs_t[k + 1] - cs_t[lo]) / count,
+        c[k],
+    ])
+    carry.extend(zip(correct.tolist(), times.tolist()))
+    return X
+
+
+class Reservoir:
+    """Fixed-size uniform sample of a stream of (X row, y) pairs (Algorithm R, vectorized per batch)."""
+
+    def __init__(self, capacity, n_features=4, seed=0):
+        self.capacity = capacity
+        self.X = np.empty((capacity, n_features), dtype=np.float64)
+        self.y = np.empty(capacity, dtype=np.int64)
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, X, y):
+        n = len(y)
+        if not n:
+            return
+        free = max(0, min(self.capacity - self.seen, n))
+        if free:
+            self.X[self.seen:self.seen + free] = X[:free]
+            self.y[self.seen:self.seen + free] = y[:free]
+        if free < n:
+            # row with stream index i replaces a random slot with probability capacity / (i + 1);
+            # duplicate slots resolve to the later row, as in the sequential algorithm
+            idx = np.arange(self.seen + free, self.seen + n)
+            j = (self._rng.random(len(idx)) * (idx + 1)).astype(np.int64)
+            keep = j < self.capacity
+            self.X[j[keep]] = X[free:][keep]
+            self.y[j[keep]] = y[free:][keep]
+        self.seen += n
+
+    def sample(self):
+        n = min(self.seen, self.capacity)
+        return self.X[:n], self.y[:n]
+
+
+def replay_corpus(folder="logs", window=3, max_samples=500_000, carry_across_sessions=False,
+                  chunk_rows=CHUNK_ROWS, seed=0):
+    """
+    Stream every session log in folder and return a Reservoir of engine
+    (features, label) rows. With carry_across_sessions=False the rolling
+    window restarts with every session file, as it does in the app.
+    """
+    reservoir = Reservoir(max_samples, seed=seed)
+    carries = {}  # user -> deque of the last `window` attempts
+    for path in session_files(folder):
+        if not carry_across_sessions:
+            carries.clear()
+        for chunk in read_chunks(path, ("user", "difficulty", "correct", "time_taken"), chunk_rows):
+            level = pd.Categorical(chunk["difficulty"], categories=LEVELS).codes.astype(np.int64)
+            known = level >= 0  # skip rows with an unknown difficulty name
+            if not known.any():
+                continue
+            level = level[known]
+            users = chunk["user"].astype(str).to_numpy()[known]
+            correct = _as_bool(chunk["correct"])[known]
+            times = pd.to_numeric(chunk["time_taken"], errors="coerce").fillna(0.0).to_numpy()[known]
+            for user in pd.unique(users):
+                mask = users == user
+                carry = carries.get(user)
+                if carry is None:
+                    carry = carries[user] = deque(maxlen=window)
+                X = rolling_features(level[mask], correct[mask], times[mask], carry, window)
+                y = _heuristic_labels(X[:, 0].astype(np.int64), X[:, 1], X[:, 2])
+                reservoir.add(X, y)
+    return reservoir
+
+
+def train_from_logs(folder="logs", window=3, max_samples=500_000, sim_samples=2000,
+                    random_state=42, carry_across_sessions=False):
+    """Train a DecisionTreeClassifier on the replayed corpus. Returns (clf, n_attempts, val_accuracy)."""
+    from sklearn.model_selection import train_test_split
+    from sklearn.tree import DecisionTreeClassifier
+
+    reservoir = replay_corpus(folder, window, max_samples, carry_across_sessions, seed=random_state)
+    X, y = reservoir.sample()
+    if not len(y):
+        raise ValueError(f"No attempts found in {folder}")
+    if sim_samples:
+        X_sim, y_sim = generate_simulated_data(n_samples=sim_samples, window=window, seed=random_state + 1)
+        X = np.vstack([X_sim, X])
+        y = np.concatenate([y_sim, y])
+    X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.1, random_state=random_state)
+    clf = DecisionTreeClassifier(max_depth=6, random_state=random_state)
+    clf.fit(X_train, y_train)
+    val_acc = float((clf.predict(X_val) == y_val).mean())
+    return clf, reservoir.seen, val_acc
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retrain the adaptive model from saved session logs")
+    parser.add_argument("folder", nargs="?", default="logs")
+    parser.add_argument("--window", type=int, default=3)
+    parser.add_argument("--max-samples", type=int, default=500_000)
+    parser.add_argument("--sim-samples", type=int, default=2000,
+                        help="simulated rows mixed in (0 = real data only)")
+    parser.add_argument("--carry-across-sessions", action="store_true",
+                        help="keep each learner's rolling window between sessions")
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--publish", action="store_true", help="also make it the current model")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.folder):
+        print(f"❌ No such folder: {args.folder}")
+        return 1
+    clf, n, acc = train_from_logs(args.folder, args.window, args.max_samples, args.sim_samples,
+                                  carry_across_sessions=args.carry_across_sessions)
+    print(f"📈 Replayed {n:,} attempts; validation accuracy {acc:.3f}")
+    if args.publish:
+        REGISTRY.publish(args.model_path, clf)
+        print(f"✅ Published version {read_manifest(args.model_path)['current']} as {args.model_path}")
+    else:
+        path = save_versioned(clf, args.model_path)
+        print(f"💾 Saved model version {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Background retraining for the adaptive engine.
+
+- AdaptiveEngineML.update hands its full retrain buffer to a RetrainWorker
+  instead of fitting a new tree inline, so the learner who triggers the
+  retrain never waits for it.
+- Engines keep predicting with the currently published model; the job
+  publishes the new model to the registry when it is done.
+- Triggers for the same model are coalesced: while a retrain is running,
+  further buffers are merged into a single pending batch that runs next.
+- stats() exposes retrain durations and queue depth.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import count, observe
+
+
+class RetrainWorker:
+    def __init__(self, max_workers=1):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrain")
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = {}     # key -> [job, X, y] waiting to run
+        self._running = set()  # keys with a job in flight
+        self._metrics = {
+            "submitted": 0,
+            "coalesced": 0,
+            "completed": 0,
+            "failed": 0,
+            "last_duration_s": None,
+            "max_duration_s": 0.0,
+            "total_duration_s": 0.0,
+        }
+
+    def submit(self, key, X, y, job):
+        """
+        Queue a retrain for key (usually the model path).
+
+        job(X, y) does the actual fit + publish. If a batch for key is
+        already waiting, X/y are appended to it and job is dropped.
+        """
+        with self._lock:
+            self._metrics["submitted"] += 1
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending[1].extend(X)
+                pending[2].extend(y)
+                self._metrics["coalesced"] += 1
+                count("retrain.coalesced")
+                return
+            self._pending[key] = [job, list(X), list(y)]
+            if key not in self._running:
+                self._running.add(key)
+                self._executor.submit(self._drain, key)
+
+    def _drain(self, key):
+        while True:
+            with self._lock:
+                pending = self._pending.pop(key, None)
+                if pending is None:
+                    self._running.discard(key)
+                    self._idle.notify_all()
+                    return
+            job, X, y = pending
+            t0 = time.perf_counter()
+            try:
+                job(X, y)
+                ok = True
+            except Exception as e:
+                print("❌ Retrain failed:", e)
+                ok = False
+            elapsed = time.perf_counter() - t0
+            observe("retrain.job", elapsed)
+            with self._lock:
+                m = self._metrics
+                m["completed" if ok else "failed"] += 1
+                m["last_duration_s"] = elapsed
+                m["max_duration_s"] = max(m["max_duration_s"], elapsed)
+                m["total_duration_s"] += elapsed
+
+    def queue_depth(self):
+        """Number of retrain batches waiting to start (not counting running ones)."""
+        return len(self._pending)
+
+    def stats(self):
+        """Snapshot of retrain metrics, including queue depth and jobs in flight."""
+        with self._lock:
+            out = dict(self._metrics)
+            out["queue_depth"] = len(self._pending)
+            out["in_flight"] = len(self._running)
+        return out
+
+    def wait(self, timeout=None):
+        """Block until no retrain is queued or running. Returns False on timeout."""
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._running, timeout=timeout)
+
+
+# Default worker shared by every AdaptiveEngineML in the process.
+RETRAIN_WORKER = RetrainWorker()
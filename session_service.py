@@ -0,0 +1,348 @@
+"""
+Asyncio session service: many learners, one process, one shared model.
+
+Endpoints (coroutines on SessionService, mirrored by LocalClient):
+
+    start_session(user, initial_level="Easy", rounds=None) -> first puzzle
+    next_puzzle(session_id)                                -> current puzzle
+    submit_answer(session_id, answer, time_taken=None)     -> verdict + next puzzle
+    end_session(session_id)                                -> summary
+
+- Per-learner state is one slotted Session (engine, tracker, current
+  puzzle, counters). Every engine uses the registry's shared model, so a
+  session costs a few KiB however many tenants there are.
+- Sessions are kept in least-recently-used order; a background task evicts
+  the ones idle for longer than idle_timeout, and max_sessions caps the
+  total by evicting the least recently used.
+- Answers are not scored on the event loop: submits that arrive while a
+  batch is being scored queue up and go to the executor together as one
+  update_many() call, so predict cost is paid per batch and the loop stays
+  free for I/O. Retrains already run on the engine's retrain worker.
+- Puzzle generation and tracker logging are a few microseconds and stay on
+  the loop.
+- With snapshots (an engine_snapshots.EngineSnapshotStore) every scored
+  answer is also snapshotted by user name, in the same executor job, and
+  start_session resumes a known user's engine state, so learners pick up
+  where they left off after a restart or eviction.
+- With personal (a personal_models.PersonalModelCache) every learner's
+  engine also trains and, once fitted, predicts with the user's own model.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from adaptive_engine_ml import LEVELS, MODEL_PATH, AdaptiveEngineML, update_many
+from puzzle_generator import PooledPuzzleGenerator
+from tracker import PerformanceTracker
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+class SessionBusy(RuntimeError):
+    pass
+
+
+class Session:
+    __slots__ = ("session_id", "user", "engine", "tracker", "puzzle", "round", "rounds",
+                 "issued_at", "last_seen", "busy")
+
+    def __init__(self, session_id, user, engine, tracker, rounds):
+        self.session_id = session_id
+        self.user = user
+        self.engine = engine
+        self.tracker = tracker
+        self.puzzle = None
+        self.round = 1
+        self.rounds = rounds
+        self.issued_at = 0.0
+        self.last_seen = time.monotonic()
+        self.busy = False
+
+    @property
+    def done(self):
+        return self.rounds is not None and self.round > self.rounds
+
+
+class SessionService:
+    def __init__(self, model_path=MODEL_PATH, registry=None, mode="tree", generator=None,
+                 idle_timeout=900.0, max_sessions=None, executor=None,
+                 sink=None, folder="logs", retain=None, snapshots=None, personal=None):
+        """
+        sink / folder / retain are passed to each session's PerformanceTracker.
+        executor scores answer batches (default: one worker thread, so batches run in order).
+        snapshots: optional EngineSnapshotStore for per-user engine state.
+        personal: optional PersonalModelCache for per-user models (flushed on close()).
+        """
+        self.model_path = model_path
+        self.registry = registry
+        self.mode = mode
+        self.generator = generator if generator is not None else PooledPuzzleGenerator()
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sink, self.folder, self.retain = sink, folder, retain
+        self.snapshots = snapshots
+        self.personal = personal
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="scoring")
+        self._sessions = OrderedDict()  # session_id -> Session, least recently used first
+        self._pending = []              # (session, correct, time_taken, future) waiting to be scored
+        self._scoring = None            # task draining _pending
+        self._evictor = None
+        self.metrics = {"started": 0, "ended": 0, "evicted": 0, "resumed": 0, "answers": 0, "batches": 0}
+
+    # --- lifecycle ---
+
+    async def start(self):
+        """Load the shared model (off the loop) and start idle eviction."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._new_engine, "Easy")
+        if self.idle_timeout and self._evictor is None:
+            self._evictor = asyncio.create_task(self._evict_idle_loop())
+        return self
+
+    async def close(self):
+        if self._evictor is not None:
+            self._evictor.cancel()
+            self._evictor = None
+        if self._scoring is not None:
+            await self._scoring
+        for session_id in list(self._sessions):
+            self._evict(session_id)
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
+        if self.personal is not None:
+            self.personal.flush()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # --- endpoints ---
+
+    async def start_session(self, user, initial_level="Easy", rounds=None):
+        if initial_level not in LEVELS:
+            raise ValueError(f"initial_level must be one of {LEVELS}")
+        session_id = uuid.uuid4().hex
+        tracker = PerformanceTracker(user, sink=self.sink, folder=self.folder, retain=self.retain)
+        engine = None
+        if self.snapshots is not None and user in self.snapshots:
+            engine = self.snapshots.restore(user, model_path=self.model_path, registry=self.registry, mode=self.mode,
+                                            **self._personal_kwargs(user))
+            self.metrics["resumed"] += 1
+        session = Session(session_id, user, engine or self._new_engine(initial_level, user), tracker, rounds)
+        self._sessions[session_id] = session
+        self.metrics["started"] += 1
+        if self.max_sessions is not None:
+            while len(self._sessions) > self.max_sessions:
+                self._evict(next(iter(self._sessions)))
+        self._issue(session, session.engine.current_level)
+        return self._puzzle_view(session)
+
+    async def next_puzzle(self, session_id):
+        return self._puzzle_view(self._get(session_id))
+
+    async def submit_answer(self, session_id, answer, time_taken=None):
+        """
+        Score an answer. time_taken defaults to the time since the puzzle was issued.
+        Returns correct / the expected answer / next level plus the next puzzle view
+        (prompt None and done True after the last round).
+        """
+        session = self._get(session_id)
+        if session.busy:
+            raise SessionBusy(f"Session {session_id} already has an answer being scored")
+        if session.done:
+            raise ValueError(f"Session {session_id} is complete")
+        if time_taken is None:
+            time_taken = time.monotonic() - session.issued_at
+        puzzle, level = session.puzzle, session.engine.current_level
+        correct = puzzle.check_answer(answer)
+
+        session.busy = True
+        try:
+            future = asyncio.get_running_loop().create_future()
+            self._pending.append((session, correct, float(time_taken), future))
+            if self._scoring is None:
+                self._scoring = asyncio.create_task(self._score_pending())
+            next_level = await future
+        finally:
+            session.busy = False
+        # logged only once the engine has taken the attempt, so a failed or cancelled submit leaves no record
+        session.tracker.log_attempt(puzzle, correct, time_taken, level)
+
+        self.metrics["answers"] += 1
+        session.round += 1
+        result = {"correct": correct, "answer": puzzle.answer, "time_taken": time_taken, "next_level": next_level}
+        if session.done:
+            session.puzzle = None
+        else:
+            self._issue(session, next_level)
+        result.update(self._puzzle_view(session))
+        return result
+
+    async def end_session(self, session_id, save=False):
+        """Close a session and return its summary (save=True also writes the session CSV)."""
+        session = self._get(session_id)
+        summary = session.tracker.get_summary()
+        if save:
+            summary["log_path"] = session.tracker.save_csv(self.folder)
+        self._evict(session_id, ended=True)
+        return summary
+
+    def stats(self):
+        return dict(self.metrics, sessions=len(self._sessions), pending=len(self._pending))
+
+    # --- internals ---
+
+    def _personal_kwargs(self, user):
+        if self.personal is None or user is None:
+            return {}
+        return {"personal": self.personal, "personal_key": user}
+
+    def _new_engine(self, initial_level, user=None):
+        return AdaptiveEngineML(initial_level=initial_level, model_path=self.model_path,
+                                registry=self.registry, mode=self.mode, **self._personal_kwargs(user))
+
+    def _get(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise SessionNotFound(session_id)
+        session.last_seen = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _issue(self, session, level):
+        session.puzzle = self.generator.generate(level)
+        session.issued_at = time.monotonic()
+
+    @staticmethod
+    def _puzzle_view(session):
+        puzzle = session.puzzle
+        return {
+            "session_id": session.session_id,
+            "round": session.round if not session.done else session.rounds,
+            "rounds": session.rounds,
+            "level": session.engine.current_level,
+            "prompt": puzzle.prompt if puzzle is not None else None,
+            "done": session.done,
+        }
+
+    async def _score_pending(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                sessions = [s for s, _, _, _ in batch]
+                attempts = [(c, t) for _, c, t, _ in batch]
+                try:
+                    levels = await loop.run_in_executor(self._executor, self._score_batch, sessions, attempts)
+                except Exception as e:
+                    for _, _, _, future in batch:
+                        if not future.done():  # cancelled by its caller (timeout / disconnect)
+                            future.set_exception(e)
+                    continue
+                self.metrics["batches"] += 1
+                for (_, _, _, future), level in zip(batch, levels):
+                    if not future.done():
+                        future.set_result(level)
+        finally:
+            self._scoring = None
+
+    def _score_batch(self, sessions, attempts):
+        """Executor job: one update_many() for the batch, then snapshot the updated engines."""
+        levels = update_many([s.engine for s in sessions], attempts)
+        if self.snapshots is not None:
+            for s in sessions:
+                self.snapshots.save(s.user, s.engine)
+        return levels
+
+    def _evict(self, session_id, ended=False):
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        session.tracker.close()
+        self.metrics["ended" if ended else "evicted"] += 1
+
+    def evict_idle(self, now=None):
+        """Evict sessions idle for longer than idle_timeout. Returns how many were evicted."""
+        cutoff = (time.monotonic() if now is None else now) - self.idle_timeout
+        evicted = 0
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_seen > cutoff or session.busy:
+                break
+            self._evict(session_id)
+            evicted += 1
+        return evicted
+
+    async def _evict_idle_loop(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 4, 0.05))
+            self.evict_idle()
+
+
+class LocalClient:
+    """
+    In-process client for tests and demos: calls the service endpoints and
+    round-trips every response through JSON, as a network client would see it.
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    async def _call(self, endpoint, *args, **kwargs):
+        return json.loads(json.dumps(await getattr(self.service, endpoint)(*args, **kwargs)))
+
+    async def start_session(self, user, initial_level="Easy", rounds=None):
+        return await self._call("start_session", user, initial_level, rounds)
+
+    async def next_puzzle(self, session_id):
+        return await self._call("next_puzzle", session_id)
+
+    async def submit_answer(self, session_id, answer, time_taken=None):
+        return await self._call("submit_answer", session_id, answer, time_taken)
+
+    async def end_session(self, session_id, save=False):
+        return await self._call("end_session", session_id, save)
+
+
+def _solve(prompt):
+    """What a perfect learner would answer to "a <op> b = ?"."""
+    a, op, b = prompt.split()[:3]
+    a, b = int(a), int(b)
+    return {"+": a + b, "-": a - b, "*": a * b, "/": a // b}[op]
+
+
+async def _demo(learners=2000, rounds=20):
+    import random
+    async with SessionService() as service:
+        client = LocalClient(service)
+        rng = random.Random(0)
+
+        async def learner(i):
+            view = await client.start_session(f"learner{i}", rng.choice(LEVELS), rounds)
+            while not view["done"]:
+                await asyncio.sleep(0)  # let the other learners interleave
+                answer = _solve(view["prompt"]) if rng.random() < 0.7 else "?"
+                view = await client.submit_answer(view["session_id"], answer, rng.uniform(3, 25))
+            return await client.end_session(view["session_id"])
+
+        t0 = time.perf_counter()
+        summaries = await asyncio.gather(*(learner(i) for i in range(learners)))
+        elapsed = time.perf_counter() - t0
+        stats = service.stats()
+    print(f"🧪 {learners} concurrent learners x {rounds} answers in {elapsed:.2f}s "
+          f"({stats['answers'] / elapsed:,.0f} answers/s, {stats['batches']} scoring batches, "
+          f"avg batch {stats['answers'] / max(stats['batches'], 1):.0f})")
+    print(f"Mean accuracy: {sum(s['accuracy'] for s in summaries) / len(summaries):.1f}%")
+
+
+if __name__ == "__main__":
+    asyncio.run(_demo())
@@ -0,0 +1,19 @@
+import contextlib
+import io
+import os
+
+from adaptive_engine_ml import train_initial_model
+from load_simulator import run_simulation
+from model_registry import read_manifest, save_model
+
+
+def test_process_mode_with_manifest(tmp_path):
+    model_path = str(tmp_path / "model.joblib")
+    with contextlib.redirect_stdout(io.StringIO()):
+        save_model(train_initial_model(), model_path)
+    assert read_manifest(model_path) is not None
+    assert not os.path.exists(model_path)  # only the versioned files and the manifest
+
+    report = run_simulation(learners=4, answers=5, workers=2, executor="process",
+                            model_path=model_path, measure_memory=False)
+    assert report["answers"] == 20
@@ -1,45 +1,239 @@
-import pandas as pd
-import os
-from datetime import datetime
-
-class PerformanceTracker:
-    def __init__(self, user="Learner"):  # <-- two underscores before and after init
-        self.user = user
-        self.attempts = []  # list of dicts
-
-    def log_attempt(self, puzzle, correct: bool, time_taken: float, difficulty: str):
-        rec = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "user": self.user,
-            "difficulty": difficulty,
-            "prompt": puzzle.prompt,
-            "answer": puzzle.answer,
-            "correct": bool(correct),
-            "time_taken": float(time_taken)
-        }
-        self.attempts.append(rec)
-
-    def to_dataframe(self):
-        return pd.DataFrame(self.attempts)
-
-    def save_csv(self, folder="logs"):
-        df = self.to_dataframe()
-        os.makedirs(folder, exist_ok=True)
-        name = f"{self.user.replace(' ','')}{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.csv"
-        path = os.path.join(folder, name)
-        df.to_csv(path, index=False)
-        return path
-# Let's simulate a simple "puzzle" object
-class DummyPuzzle:
-    def __init__(self):
-        self.prompt = "2 + 2 = ?"
-        self.answer = "4"
-
-puzzle = DummyPuzzle()
-
-tracker = PerformanceTracker(input("Enter the user name"))
-tracker.log_attempt(puzzle, correct=True, time_taken=2.5, difficulty="Easy")
-path = tracker.save_csv()
-print("File saved at:", path)
-print("\nDataFrame Preview:\n")
-print(tracker.to_dataframe())
+import csv
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime
+
+from attempt_store import AttemptStore, FIELDS, iso_utc
+from instrumentation import timed, timer
+
+ISO_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+LEVEL_ORDER = ["Easy", "Medium", "Hard"]
+
+
+class SummaryStats:
+    """
+    Running totals for ProgressSummary / the dashboard, updated on every
+    logged attempt so reading them is O(1) (O(#difficulties) for the
+    per-difficulty table) whatever the session length.
+    """
+
+    def __init__(self, recent=5):
+        self.total = 0
+        self.correct = 0
+        # summed the way pandas does: plain sum overall (Series.mean), Kahan per difficulty
+        # (groupby mean), so printed averages match the DataFrame version digit for digit
+        self.time_sum = 0.0
+        self.by_diff = {}  # difficulty -> [attempts, correct, time_sum, kahan compensation]
+        self.recent = deque(maxlen=recent)  # (correct, time_taken, difficulty), newest last
+
+    @staticmethod
+    def _add(acc, i, x):
+        # Kahan summation: acc[i] is the running sum, acc[i + 1] the compensation term
+        y = x - acc[i + 1]
+        t = acc[i] + y
+        acc[i + 1] = (t - acc[i]) - y
+        acc[i] = t
+
+    def add(self, difficulty, correct, time_taken):
+        self.total += 1
+        self.correct += correct
+        self.time_sum += time_taken
+        d = self.by_diff.get(difficulty)
+        if d is None:
+            d = self.by_diff[difficulty] = [0, 0, 0.0, 0.0]
+        d[0] += 1
+        d[1] += correct
+        self._add(d, 2, time_taken)
+        self.recent.append((correct, time_taken, difficulty))
+
+    def accuracy(self):
+        """Overall accuracy in percent (0 when empty)."""
+        return self.correct / self.total * 100.0 if self.total else 0.0
+
+    def avg_time(self):
+        return self.time_sum / self.total if self.total else 0.0
+
+    def by_difficulty(self):
+        """[(difficulty, attempts, accuracy %, avg_time)], sorted by name like groupby()."""
+        return [(d, n, c / n * 100, t / n) for d, (n, c, t, _) in sorted(self.by_diff.items())]
+
+    def trend(self, n=5):
+        """(attempts, accuracy %, avg_time) over the last n (<= recent) attempts."""
+        last = list(self.recent)[-n:]
+        if not last:
+            return 0, 0.0, 0.0
+        k = len(last)
+        return k, sum(c for c, _, _ in last) / k * 100, sum(t for _, t, _ in last) / k
+
+    def recommend_next_level(self):
+        """Same heuristic as ProgressSummary._recommend_next_level, from the last 3 attempts."""
+        last = list(self.recent)[-3:]
+        if not last:
+            return "Medium"
+        acc = sum(c for c, _, _ in last) / len(last)
+        time_avg = sum(t for _, t, _ in last) / len(last)
+        most_recent = last[-1][2]
+        if acc >= 0.66 and time_avg < 12:
+            return LEVEL_ORDER[min(LEVEL_ORDER.index(most_recent) + 1, 2)]
+        if acc <= 0.33 or time_avg > 18:
+            return LEVEL_ORDER[max(LEVEL_ORDER.index(most_recent) - 1, 0)]
+        return most_recent
+
+    def as_dict(self):
+        return {
+            "total": self.total,
+            "correct": self.correct,
+            "accuracy": self.accuracy(),
+            "avg_time": self.avg_time(),
+            "by_difficulty": self.by_difficulty(),
+            "recommended_next_level": self.recommend_next_level(),
+        }
+
+
+class PerformanceTracker:
+    def __init__(self, user="Learner", sink=None, folder="logs",
+                 flush_every=50, flush_interval=5.0, retain=None):  # <-- two underscores before and after init
+        """
+        sink=None keeps every attempt in memory (save_csv writes them at the end).
+        sink="csv" / "jsonl" also appends each attempt to a per-user file in folder
+        as it is logged; writes are buffered and flushed every flush_every records
+        or flush_interval seconds. retain=N then keeps only the last N attempts in
+        memory; to_dataframe() reads the full log back from the file.
+
+        Attempts are kept column-wise in an AttemptStore; iterating or
+        indexing self.attempts still yields the classic per-attempt dicts.
+        """
+        if sink not in (None, "csv", "jsonl"):
+            raise ValueError("sink must be None, 'csv' or 'jsonl'")
+        self.user = user
+        self.attempts = AttemptStore(user, retain=retain)
+        self.stats = SummaryStats()  # covers every attempt, even those dropped by retain
+        self.sink = sink
+        self.sink_path = None
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._fh = None
+        self._writer = None
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        if sink:
+            self._open_sink(folder)
+
+    def _log_name(self, ext):
+        return f"{self.user.replace(' ','')}{datetime.utcnow().strftime('%Y%m%dT%H%M%S%fZ')}.{ext}"
+
+    def _create_log(self, folder, ext, **open_kwargs):
+        """Open a new, uniquely named log file in folder; returns (path, file)."""
+        os.makedirs(folder, exist_ok=True)
+        while True:
+            path = os.path.join(folder, self._log_name(ext))
+            try:
+                # exclusive create: two trackers for one user in the same microsecond don't share a file
+                return path, open(path, "x", newline="", encoding="utf-8", **open_kwargs)
+            except FileExistsError:
+                continue
+
+    def _open_sink(self, folder):
+        self.sink_path, self._fh = self._create_log(folder, self.sink, buffering=64 * 1024)
+        if self.sink == "csv":
+            self._writer = csv.writer(self._fh)
+            self._writer.writerow(FIELDS)
+
+    @timed("tracker.log_attempt")
+    def log_attempt(self, puzzle, correct: bool, time_taken: float, difficulty: str):
+        ts_ns = time.time_ns()
+        correct, time_taken = bool(correct), float(time_taken)
+        self.attempts.append(ts_ns, difficulty, puzzle, puzzle.answer, correct, time_taken)
+        self.stats.add(difficulty, correct, time_taken)
+        if self._fh is not None:
+            self._write({
+                "timestamp": iso_utc(ts_ns),
+                "user": self.user,
+                "difficulty": difficulty,
+                "prompt": puzzle.prompt,
+                "answer": puzzle.answer,
+                "correct": correct,
+                "time_taken": time_taken
+            })
+
+    def _write(self, rec):
+        if self._writer is not None:
+            self._writer.writerow([rec[f] for f in FIELDS])
+        else:
+            self._fh.write(json.dumps(rec) + "\n")
+        self._unflushed += 1
+        if (self._unflushed >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Push buffered sink writes to the OS."""
+        if self._fh is not None and self._unflushed:
+            with timer("tracker.flush"):
+                self._fh.flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """Flush and close the sink file (the tracker stays readable)."""
+        if self._fh is not None:
+            self.flush()
+            self._fh.close()
+            self._fh = None
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_summary(self):
+        """Current running summary as a plain dict."""
+        return self.stats.as_dict()
+
+    def to_dataframe(self):
+        if self.sink_path is None:
+            return self.attempts.to_dataframe()
+        import pandas as pd
+
+        # the sink file is the complete log; memory may only hold the last `retain` attempts
+        self.flush()
+        if os.path.getsize(self.sink_path) == 0:
+            return pd.DataFrame(columns=FIELDS)
+        if self.sink == "csv":
+            df = pd.read_csv(self.sink_path)
+        else:
+            df = pd.read_json(self.sink_path, lines=True, convert_dates=False)
+        df["timestamp"] = pd.to_datetime(df["timestamp"], format=ISO_FORMAT)
+        return df
+
+    def save_csv(self, folder="logs"):
+        if self.sink == "csv":
+            # already on disk, appended as we went
+            self.flush()
+            return self.sink_path
+        df = self.to_dataframe()
+        path, f = self._create_log(folder, "csv")
+        with f:
+            df.to_csv(f, index=False, date_format=ISO_FORMAT)
+        return path
+
+
+if __name__ == "__main__":
+    # Let's simulate a simple "puzzle" object
+    class DummyPuzzle:
+        def __init__(self):
+            self.prompt = "2 + 2 = ?"
+            self.answer = "4"
+
+    puzzle = DummyPuzzle()
+
+    tracker = PerformanceTracker(input("Enter the user name"))
+    tracker.log_attempt(puzzle, correct=True, time_taken=2.5, difficulty="Easy")
+    path = tracker.save_csv()
+    print("File saved at:", path)
+    print("\nDataFrame Preview:\n")
+    print(tracker.to_dataframe())
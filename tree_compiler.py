@@ -0,0 +1,250 @@
+"""
+Compile a fitted DecisionTreeClassifier into a lookup table.
+
+Three of the four features are small integers (cur_level 0-2,
+correct_count 0-window, last_correct 0/1); only avg_time is continuous.
+For every discrete combination the tree reduces to a step function of
+avg_time, which is stored as a sorted list of split thresholds plus the
+label of each interval:
+
+    table[(cur_level, correct_count, last_correct)] = (thresholds, labels)
+    label = labels[bisect_left(thresholds, avg_time)]
+
+so predicting one row is a dict lookup and a bisect, with no sklearn or
+NumPy objects created per call.
+
+sklearn casts X to float32 before comparing against its float64 split
+thresholds; the compiled thresholds are adjusted so plain float64 inputs
+land on the same side as they would inside clf.predict. verify() checks
+this against clf.predict on a dense grid.
+
+FlatTree is the same tree as one flat structured NumPy array (children,
+feature, adjusted threshold and label per node). It is what
+model_registry saves next to each model version as <name>.tree.npy and
+loads with np.load(mmap_mode="r"), so processes share one page-cached
+copy and predicting needs neither unpickling nor sklearn.
+"""
+
+import weakref
+from bisect import bisect_left
+
+import numpy as np
+
+AVG_TIME = 2  # index of the only continuous feature
+
+
+def _f32_threshold(thr):
+    """Largest float64 x with float32(x) <= thr, i.e. the float64 split equivalent to sklearn's."""
+    f = np.float32(thr)
+    if float(f) > thr:
+        f = np.nextafter(f, np.float32(-np.inf))
+    nxt = np.nextafter(f, np.float32(np.inf))
+    mid = (float(f) + float(nxt)) / 2.0  # exact in float64
+    # values below mid round down to f; mid itself rounds to the even neighbour
+    f_is_even = int(np.array(f, dtype=np.float32).view(np.uint32)) % 2 == 0
+    return mid if f_is_even else float(np.nextafter(mid, -np.inf))
+
+
+class CompiledTree:
+    def __init__(self, table, tree_arrays, window=3):
+        self.table = table
+        self.window = window
+        self._arrays = None  # padded table for predict(), built on first use
+        # plain-list copy of the tree for rows outside the compiled grid
+        self._left, self._right, self._feature, self._threshold, self._label = tree_arrays
+
+    def _walk(self, row):
+        node = 0
+        left = self._left
+        while left[node] != -1:
+            if row[self._feature[node]] <= self._threshold[node]:
+                node = left[node]
+            else:
+                node = self._right[node]
+        return self._label[node]
+
+    def predict_one(self, row):
+        """Predict the label for one [cur_level, correct_count, avg_time, last_correct] row."""
+        entry = self.table.get((row[0], row[1], row[3]))
+        if entry is None:
+            return self._walk(row)
+        thresholds, labels = entry
+        return labels[bisect_left(thresholds, row[2])]
+
+    def _dense(self):
+        """The table as padded arrays: thresholds (+inf padded) and labels per cell, cell = (level, correct, last)."""
+        if self._arrays is None:
+            w = self.window + 1
+            width = max(len(thr) for thr, _ in self.table.values())
+            thresholds = np.full((3 * w * 2, width), np.inf)
+            labels = np.zeros((3 * w * 2, width + 1), dtype=np.int64)
+            for (level, correct, last), (thr, lab) in self.table.items():
+                cell = (level * w + correct) * 2 + last
+                thresholds[cell, :len(thr)] = thr
+                labels[cell, :len(lab)] = lab
+                labels[cell, len(lab):] = lab[-1]
+            self._arrays = (thresholds, labels)
+        return self._arrays
+
+    def predict(self, X):
+        """sklearn-style batch predict: the table lookup for all rows at once."""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, 4)
+        thresholds, labels = self._dense()
+        level, correct, last = X[:, 0], X[:, 1], X[:, 3]
+        cell = (level * (self.window + 1) + correct) * 2 + last
+        in_grid = ((level >= 0) & (level <= 2) & (correct >= 0) & (correct <= self.window) & ((last == 0) | (last == 1))
+                   & (level == np.rint(level)) & (correct == np.rint(correct)))
+        cell = np.where(in_grid, cell, 0).astype(np.int64)
+        # number of thresholds < avg_time, i.e. bisect_left in each row's cell
+        pos = (thresholds[cell] < X[:, AVG_TIME, None]).sum(axis=1)
+        out = labels[cell, pos]
+        for i in np.flatnonzero(~in_grid).tolist():
+            out[i] = self._walk(X[i].tolist())
+        return out
+
+
+NODE_DTYPE = np.dtype([("left", "<i4"), ("right", "<i4"), ("feature", "<i4"),
+                       ("threshold", "<f8"), ("label", "<i8")])
+
+
+class FlatTree:
+    """A fitted decision tree as one structured array of nodes; predicts like clf.predict."""
+
+    def __init__(self, nodes, n_features=4):
+        self.nodes = nodes
+        self.n_features_in_ = n_features
+        self.classes_ = np.unique(nodes["label"][nodes["left"] == -1])
+
+    @classmethod
+    def from_estimator(cls, clf):
+        left, right, feature, threshold, label = _tree_arrays(clf)
+        nodes = np.empty(len(left), dtype=NODE_DTYPE)
+        nodes["left"], nodes["right"], nodes["feature"] = left, right, feature
+        nodes["threshold"], nodes["label"] = threshold, label
+        return cls(nodes, clf.n_features_in_)
+
+    def save(self, file):
+        """np.save the node array to a path or open binary file."""
+        np.save(file, self.nodes, allow_pickle=False)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        nodes = np.load(path, mmap_mode="r" if mmap else None, allow_pickle=False)
+        if nodes.dtype != NODE_DTYPE:
+            raise ValueError(f"{path} is not a flat tree export")
+        return cls(nodes)
+
+    def arrays(self):
+        """(left, right, feature, threshold, label) as plain lists, thresholds already adjusted."""
+        n = self.nodes
+        return (n["left"].tolist(), n["right"].tolist(), n["feature"].tolist(),
+                n["threshold"].tolist(), n["label"].tolist())
+
+    def predict(self, X):
+        """Walk all rows down the tree together, one level per step."""
+        X = np.asarray(X, dtype=np.float64)
+        nodes = self.nodes
+        left, right, feature, threshold = nodes["left"], nodes["right"], nodes["feature"], nodes["threshold"]
+        node = np.zeros(len(X), dtype=np.int64)
+        rows = np.nonzero(left[node] != -1)[0]
+        while len(rows):
+            n = node[rows]
+            go_left = X[rows, feature[n]] <= threshold[n]
+            node[rows] = np.where(go_left, left[n], right[n])
+            rows = rows[left[node[rows]] != -1]
+        return np.asarray(nodes["label"][node])
+
+
+def _tree_arrays(clf):
+    if isinstance(clf, FlatTree):
+        return clf.arrays()
+    t = clf.tree_
+    labels = clf.classes_[t.value[:, 0, :].argmax(axis=1)]
+    threshold = [_f32_threshold(x) if f >= 0 else 0.0 for f, x in zip(t.feature.tolist(), t.threshold.tolist())]
+    return (t.children_left.tolist(), t.children_right.tolist(), t.feature.tolist(),
+            threshold, [int(v) for v in labels])
+
+
+def compile_tree(clf, window=3):
+    """Build a CompiledTree for every (cur_level, correct_count, last_correct) with 0 <= correct_count <= window."""
+    arrays = _tree_arrays(clf)
+    left, right, feature, threshold, label = arrays
+
+    def segments(node, fixed, lo, hi):
+        # step function of avg_time on (lo, hi] as [(upper_bound, label), ...]
+        if left[node] == -1:
+            return [(hi, label[node])]
+        f, t = feature[node], threshold[node]
+        if f != AVG_TIME:
+            nxt = left[node] if fixed[f] <= t else right[node]
+            return segments(nxt, fixed, lo, hi)
+        if t >= hi:
+            return segments(left[node], fixed, lo, hi)
+        if t < lo:
+            return segments(right[node], fixed, lo, hi)
+        return segments(left[node], fixed, lo, t) + segments(right[node], fixed, t, hi)
+
+    table = {}
+    for level in range(3):
+        for correct in range(window + 1):
+            for last in (0, 1):
+                fixed = {0: level, 1: correct, 3: last}
+                segs = segments(0, fixed, -np.inf, np.inf)
+                merged = [segs[0]]
+                for hi, lab in segs[1:]:
+                    if lab == merged[-1][1]:
+                        merged[-1] = (hi, lab)
+                    else:
+                        merged.append((hi, lab))
+                thresholds = [hi for hi, _ in merged[:-1]]
+                labels = [lab for _, lab in merged]
+                table[(level, correct, last)] = (thresholds, labels)
+    return CompiledTree(table, arrays, window)
+
+
+def verify(compiled, clf, window=3, step=0.01, max_time=60.0):
+    """
+    Compare compiled.predict_one with clf.predict for every discrete
+    combination x avg_time on a dense grid over [0, max_time] by step, plus
+    each split threshold, its float neighbours and the midpoints between
+    thresholds. Both sides are step functions that can only change at split
+    thresholds, so step=None (critical points only) is already a complete
+    check. Returns the number of mismatches.
+    """
+    splits = sorted(set(t for f, t in zip(compiled._feature, compiled._threshold) if f == AVG_TIME))
+    times = set() if step is None else set(np.arange(0.0, max_time, step).tolist())
+    for thr in splits:
+        times.update((thr, float(np.nextafter(thr, -np.inf)), float(np.nextafter(thr, np.inf))))
+    times.update((a + b) / 2.0 for a, b in zip(splits, splits[1:]))
+    times.update((-1.0, (splits[-1] if splits else 0.0) + 1.0))
+    times = sorted(times)
+    rows = [[level, correct, t, last]
+            for level in range(3) for correct in range(window + 1) for last in (0, 1)
+            for t in times]
+    expected = clf.predict(np.array(rows))
+    got = [compiled.predict_one(r) for r in rows]
+    return int(sum(1 for a, b in zip(got, expected.tolist()) if a != b))
+
+
+_COMPILED = weakref.WeakKeyDictionary()  # fitted clf -> {window: CompiledTree, or None if it failed to verify}
+
+
+def compiled_for(clf, window=3):
+    """
+    Cached, verified CompiledTree for clf covering correct_count up to
+    window, or None if clf can't be compiled (not a fitted tree, or
+    verify() found mismatches).
+    """
+    try:
+        return _COMPILED[clf][window]
+    except KeyError:
+        pass
+    except TypeError:
+        return None  # not weak-referenceable / hashable
+    compiled = None
+    if (isinstance(clf, FlatTree) or hasattr(clf, "tree_")) and getattr(clf, "n_features_in_", 4) == 4:
+        compiled = compile_tree(clf, window)
+        if verify(compiled, clf, window, step=None) != 0:
+            compiled = None
+    _COMPILED.setdefault(clf, {})[window] = compiled
+    return compiled